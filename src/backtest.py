@@ -0,0 +1,111 @@
+"""
+Serial Backtest Engine
+----------------------
+Per-market evaluation of the SG Trend Indicator model on a single
+DataFrame, plus the sector/portfolio aggregation shared by the serial
+and process-pool execution modes.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from models import generate_trend_signals
+from engine import SECTORS, RANGE_WINDOW, get_sector, get_sector_cap, get_contract_terms
+from profiling import stage
+from cache import ResultCache, fingerprint, make_key
+
+
+def backtest_symbol(symbol: str, df: pd.DataFrame, risk_per_asset: float, short_window: int = 20,
+                    long_window: int = 120, range_window: int = RANGE_WINDOW,
+                    cache: Optional[ResultCache] = None) -> pd.Series:
+    """
+    Per-market leg of the serial engine: trend signal, volatility sizing,
+    sector cap and daily Net_PnL indexed by Date.
+
+    With a ResultCache, the signal, Daily_Range and Net_PnL arrays are
+    reused from earlier runs whenever their inputs are unchanged.
+    """
+    if cache is not None:
+        return _cached_backtest_symbol(symbol, df, risk_per_asset, short_window, long_window,
+                                       range_window, cache)
+
+    # Apply the actual Trend Indicator model from models.py
+    with stage('signals', symbol=symbol):
+        df = generate_trend_signals(df, short_window, long_window)
+    with stage('sizing_pnl', symbol=symbol):
+        return size_and_pnl(symbol, df, risk_per_asset, range_window)
+
+
+def daily_range(close: pd.Series, range_window: int = RANGE_WINDOW) -> pd.Series:
+    """Rolling mean absolute daily change used for volatility sizing."""
+    return close.diff().abs().rolling(range_window).mean()
+
+
+def size_and_pnl(symbol: str, df: pd.DataFrame, risk_per_asset: float,
+                 range_window: int = RANGE_WINDOW) -> pd.Series:
+    """
+    Sizing/PnL block of the serial engine for a frame that already carries
+    a Signal column: volatility sizing, sector cap and daily Net_PnL.
+    """
+    # Volatility-Adjusted Position Sizing
+    df['Daily_Range'] = daily_range(df['Close'], range_window)
+    return position_pnl(symbol, df, risk_per_asset)
+
+
+def position_pnl(symbol: str, df: pd.DataFrame, risk_per_asset: float) -> pd.Series:
+    """Contract counts and Net_PnL from the Signal and Daily_Range columns."""
+    current_sector = get_sector(symbol)
+
+    # PRECISE CONTRACT SPECIFICATION MAPPING FROM ENGINE.PY
+    # Falls back to a generic contract only if the symbol is missing from engine.py
+    tick_size, tick_val = get_contract_terms(symbol)
+
+    contract_vola_dollars = df['Daily_Range'] * (tick_val / tick_size)
+    df['Pos_Size'] = (risk_per_asset / contract_vola_dollars.replace(0, np.nan)).fillna(0)
+
+    # Exposure Management (Sector Caps)
+    cap = get_sector_cap(current_sector)
+    df['Pos_Size'] = df['Pos_Size'].clip(0, cap).round()
+
+    multiplier = (tick_val / tick_size)
+    df['Net_PnL'] = (df['Close'].diff() * multiplier * df['Pos_Size'] * df['Signal'].shift(1)).fillna(0)
+    return df.set_index('Date')['Net_PnL']
+
+
+def _cached_backtest_symbol(symbol: str, df: pd.DataFrame, risk_per_asset: float, short_window: int,
+                            long_window: int, range_window: int, cache: ResultCache) -> pd.Series:
+    # Stage keys chain: prices -> signals / range -> pnl (+ risk budget, contract spec, cap)
+    data_key = fingerprint(df['Date'].to_numpy(), df['Close'].to_numpy())
+    signal_key = make_key('signals', data_key, short_window, long_window)
+    range_key = make_key('range', data_key, range_window)
+    pnl_key = make_key('pnl', signal_key, range_key, float(risk_per_asset),
+                       get_contract_terms(symbol), get_sector_cap(get_sector(symbol)))
+
+    pnl = cache.get('pnl', pnl_key)
+    if pnl is not None:
+        return pd.Series(pnl, index=pd.DatetimeIndex(df['Date'], name='Date'), name='Net_PnL')
+
+    with stage('signals', symbol=symbol):
+        signal = cache.get_or_compute('signals', signal_key, lambda: generate_trend_signals(
+            df, short_window, long_window)['Signal'].to_numpy(np.int8))
+    with stage('sizing_pnl', symbol=symbol):
+        rng = cache.get_or_compute('range', range_key, lambda: daily_range(df['Close'], range_window).to_numpy())
+        frame = pd.DataFrame({'Date': df['Date'], 'Close': df['Close'], 'Signal': signal, 'Daily_Range': rng})
+        net_pnl = position_pnl(symbol, frame, risk_per_asset)
+        cache.put('pnl', pnl_key, net_pnl.to_numpy())
+    return net_pnl
+
+
+def aggregate_sector_pnls(sector_pnls: Dict[str, List[pd.Series]]) -> Optional[pd.DataFrame]:
+    """
+    Outer-joins per-symbol Net_PnL series within each sector and returns
+    daily PnL per sector (one column each, in SECTORS order).
+    """
+    with stage('aggregate'):
+        combined = {sector: pd.concat(sector_pnls[sector], axis=1).fillna(0).sum(axis=1)
+                    for sector in SECTORS if sector_pnls.get(sector)}
+        if not combined:
+            return None
+        return pd.concat(combined, axis=1).fillna(0)
@@ -0,0 +1,279 @@
+"""
+Engine Benchmark Suite
+----------------------
+Reproducible timings of the hot paths of the research pipeline:
+
+    generate    generator.generate_paths into a fresh store
+    csv_load    reading per-symbol CSV files (legacy layout)
+    signals     models.generate_trend_signals per symbol
+    sizing_pnl  backtest.size_and_pnl per symbol (vol sizing, caps, PnL)
+    aggregate   sector aggregation plus the portfolio metrics tail
+    panel       panel.run_panel_backtest over the whole universe
+    sweep       panel.run_panel_sweep over an SMA window grid
+
+Every case runs in its own freshly spawned process on seeded synthetic
+data, so peak RSS belongs to that case alone. Cases scale along the
+number of symbols, the history length (daily through minute bars) and
+the size of the parameter grid. Results are written as JSON keyed by
+git commit; --compare diffs two result files and exits non-zero when a
+case slowed down beyond the tolerance.
+
+    python bench.py [--suite quick|full] [--out FILE]
+    python bench.py --compare old.json new.json [--tolerance 0.15]
+"""
+
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict, field
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Bars per history length; 'minute' is one year of 390-bar sessions
+HISTORY_BARS = {'daily': 6_800, 'hourly': 6_800 * 7, 'minute': 390 * 252}
+HISTORY_FREQ = {'daily': 'B', 'hourly': 'h', 'minute': 'min'}
+
+STAGES = ('generate', 'csv_load', 'signals', 'sizing_pnl', 'aggregate', 'panel', 'sweep')
+
+
+@dataclass
+class Case:
+    """One benchmark measurement: a stage at a given scale."""
+    stage: str
+    symbols: int = 57
+    history: str = 'daily'
+    pairs: int = 0
+    repeat: int = 3
+
+    @property
+    def name(self) -> str:
+        grid = f"/{self.pairs}pairs" if self.stage == 'sweep' else ''
+        return f"{self.stage}/{self.symbols}sym/{self.history}{grid}"
+
+
+@dataclass
+class CaseResult:
+    name: str
+    stage: str
+    symbols: int
+    history: str
+    bars: int
+    pairs: int
+    wall_seconds: float                # best of `repeat`
+    wall_all: List[float] = field(default_factory=list)
+    peak_rss_mb: float = 0.0           # process high-water mark after the stage ran
+    stage_rss_mb: float = 0.0          # growth of the high-water mark during the stage
+    bars_per_second: float = 0.0
+
+
+def suite_cases(suite: str = 'quick') -> List[Case]:
+    """Scaling grid: symbols at daily length, history lengths at 57 symbols, sweep grid sizes."""
+    if suite == 'quick':
+        symbols, histories, grids, repeat = (57, 228), ('daily', 'hourly'), (16, 64), 3
+    elif suite == 'full':
+        symbols, histories, grids, repeat = (57, 228, 912), ('daily', 'hourly', 'minute'), (16, 64, 256), 3
+    else:
+        raise ValueError(f"Unknown benchmark suite: {suite}")
+
+    cases = []
+    for stage in STAGES:
+        if stage == 'sweep':
+            # Named after the pairs that actually run, not the requested grid size
+            cases += [Case(stage, pairs=sweep_pair_count(*sweep_grid(p)), repeat=repeat) for p in grids]
+            continue
+        cases += [Case(stage, symbols=n, repeat=repeat) for n in symbols]
+        cases += [Case(stage, history=h, repeat=repeat) for h in histories if h != 'daily']
+    return cases
+
+
+def sweep_grid(pairs: int) -> Tuple[List[int], List[int]]:
+    """Short/long window lists giving at least `pairs` valid (short < long) combinations."""
+    side = int(np.ceil(np.sqrt(pairs)))
+    shorts = list(range(5, 5 + 5 * side, 5))
+    longs = [max(shorts) + 10 * (i + 1) for i in range(-(-pairs // side))]
+    return shorts, longs
+
+
+def sweep_pair_count(shorts: List[int], longs: List[int]) -> int:
+    """Window pairs a sweep evaluates: combinations with short < long."""
+    return sum(1 for s in shorts for l in longs if s < l)
+
+
+# --- CASE EXECUTION (runs inside a spawned worker) ---
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _prepare(case: Case, workdir: Path) -> Tuple[Callable[[], None], int]:
+    """Builds the inputs of a case (untimed) and returns (timed callable, bars processed)."""
+    from backtest import size_and_pnl, aggregate_sector_pnls
+    from engine import INITIAL_CAPITAL, TARGET_DAILY_VOL, NUM_ASSETS, get_sector
+    from generator import expand_anchors, generate_paths
+    from models import generate_trend_signals
+    from panel import build_panel, run_panel_backtest, run_panel_sweep
+    from report import performance_stats
+    from store import export_csv_folder
+
+    num_bars = HISTORY_BARS[case.history]
+    dates = pd.date_range('2000-01-03', periods=num_bars, freq=HISTORY_FREQ[case.history], name='Date')
+    anchors = expand_anchors(case.symbols)
+    bars = num_bars * case.symbols
+    risk = INITIAL_CAPITAL * TARGET_DAILY_VOL / np.sqrt(NUM_ASSETS)
+
+    if case.stage == 'generate':
+        counter = iter(range(case.repeat + 1))
+        return lambda: generate_paths(anchors, seed=0, store_path=workdir / f"gen{next(counter)}",
+                                      dates=dates, workers=1), bars
+
+    store = generate_paths(anchors, seed=0, store_path=workdir / 'market', dates=dates, workers=1)
+    traded = [s for s in store.symbols if get_sector(s)]
+    bars = num_bars * len(traded)
+
+    if case.stage == 'csv_load':
+        csv_folder = workdir / 'csv'
+        export_csv_folder(store, csv_folder)
+        files = sorted(csv_folder.glob('*.csv'))
+        return lambda: [pd.read_csv(f, parse_dates=['Date']) for f in files], bars
+
+    if case.stage == 'panel':
+        panel = build_panel(store)
+        return lambda: run_panel_backtest(panel), bars
+
+    if case.stage == 'sweep':
+        panel = build_panel(store)
+        shorts, longs = sweep_grid(case.pairs)
+        return lambda: run_panel_sweep(panel, shorts, longs), bars * sweep_pair_count(shorts, longs)
+
+    frames = [(s, store.frame(s)) for s in traded]
+    if case.stage == 'signals':
+        return lambda: [generate_trend_signals(df) for _, df in frames], bars
+
+    signalled = [(s, generate_trend_signals(df)) for s, df in frames]
+    if case.stage == 'sizing_pnl':
+        return lambda: [size_and_pnl(s, df, risk) for s, df in signalled], bars
+
+    if case.stage == 'aggregate':
+        pnls = [(s, size_and_pnl(s, df, risk)) for s, df in signalled]
+
+        def aggregate():
+            sector_pnls = {}
+            for s, pnl in pnls:
+                sector_pnls.setdefault(get_sector(s), []).append(pnl)
+            performance_stats(aggregate_sector_pnls(sector_pnls))
+        return aggregate, bars
+
+    raise ValueError(f"Unknown benchmark stage: {case.stage}")
+
+
+def run_case(case: Case) -> CaseResult:
+    """Times one case in the current process (call through run_suite for isolation)."""
+    with tempfile.TemporaryDirectory(prefix='bench_') as tmp:
+        fn, bars = _prepare(case, Path(tmp))
+        rss_before = _peak_rss_mb()
+        walls = []
+        for _ in range(case.repeat):
+            start = time.perf_counter()
+            fn()
+            walls.append(time.perf_counter() - start)
+        peak = _peak_rss_mb()
+
+    best = min(walls)
+    return CaseResult(name=case.name, stage=case.stage, symbols=case.symbols, history=case.history,
+                      bars=bars, pairs=case.pairs, wall_seconds=round(best, 6),
+                      wall_all=[round(w, 6) for w in walls], peak_rss_mb=round(peak, 1),
+                      stage_rss_mb=round(peak - rss_before, 1),
+                      bars_per_second=round(bars / best) if best > 0 else 0.0)
+
+
+# --- SUITE DRIVER ---
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parent, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(cases: List[Case], out: Optional[Path] = None, verbose: bool = True) -> Dict[str, object]:
+    """Runs every case in a fresh spawned process and optionally writes the JSON document."""
+    results = []
+    ctx = get_context('spawn')
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            result = pool.submit(run_case, case).result()
+        results.append(result)
+        if verbose:
+            print(f"{result.name:<40} {result.wall_seconds:9.4f}s {result.bars_per_second:>14,.0f} bars/s "
+                  f"{result.peak_rss_mb:8.1f} MB peak", flush=True)
+
+    document = {
+        'commit': _git_commit(),
+        'timestamp': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                    'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'results': [asdict(r) for r in results],
+    }
+    if out is not None:
+        out = Path(out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with open(out, 'w') as fh:
+            json.dump(document, fh, indent=1)
+    return document
+
+
+def compare(old: Dict[str, object], new: Dict[str, object], tolerance: float = 0.15) -> pd.DataFrame:
+    """
+    Joins two result documents by case name. `regression` flags cases
+    whose best wall time grew by more than `tolerance` (fractional).
+    """
+    a = pd.DataFrame(old['results']).set_index('name')
+    b = pd.DataFrame(new['results']).set_index('name')
+    table = pd.DataFrame({'old_seconds': a['wall_seconds'], 'new_seconds': b['wall_seconds'],
+                          'old_rss_mb': a['peak_rss_mb'], 'new_rss_mb': b['peak_rss_mb']}).dropna()
+    table['speedup'] = table['old_seconds'] / table['new_seconds']
+    table['regression'] = table['new_seconds'] > table['old_seconds'] * (1 + tolerance)
+    return table
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark the backtest engine's hot paths")
+    parser.add_argument('--suite', choices=['quick', 'full'], default='quick')
+    parser.add_argument('--stage', action='append', choices=STAGES, help="restrict to stage(s)")
+    parser.add_argument('--repeat', type=int, default=None, help="timed repetitions per case (best is kept)")
+    parser.add_argument('--out', type=Path, default=None, help="JSON file (default: benchmarks/<commit>.json)")
+    parser.add_argument('--compare', nargs=2, type=Path, metavar=('OLD', 'NEW'))
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    args = parser.parse_args()
+
+    if args.compare:
+        docs = []
+        for path in args.compare:
+            with open(path) as fh:
+                docs.append(json.load(fh))
+        table = compare(*docs, tolerance=args.tolerance)
+        pd.set_option('display.width', 160)
+        print(table.round(4))
+        sys.exit(1 if table['regression'].any() else 0)
+
+    cases = [c for c in suite_cases(args.suite) if not args.stage or c.stage in args.stage]
+    if args.repeat:
+        for c in cases:
+            c.repeat = args.repeat
+    out = args.out or Path(__file__).resolve().parent.parent / 'benchmarks' / f"{_git_commit() or 'local'}.json"
+    run_suite(cases, out)
+    print(f"\nResults written to {out}")
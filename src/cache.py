@@ -0,0 +1,157 @@
+"""
+Content-Addressed Result Cache
+------------------------------
+Persistent on-disk cache of intermediate per-symbol arrays. Keys are
+hashes of the exact inputs of a stage: the price data fingerprint plus
+the parameters that stage reads. Downstream stages hash the keys of the
+stages they consume, so changing one input (a window, the risk budget,
+a sector cap, a contract spec) invalidates only the stages that depend
+on it and everything upstream is reused.
+
+Entries are plain .npy files under <root>/<stage>/, written atomically.
+Reads refresh the file's modification time and the cache is trimmed to
+`max_bytes` by evicting least recently used entries first. Hit and miss
+counts per stage are kept for the lifetime of the object.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from store import default_data_folder
+
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 512 * 2 ** 20
+
+
+def default_cache_path() -> Path:
+    return default_data_folder() / 'cache'
+
+
+def fingerprint(*arrays: np.ndarray) -> str:
+    """Content hash of arrays (dtype, shape and bytes)."""
+    h = hashlib.blake2b(digest_size=16)
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        h.update(f"{arr.dtype.str}{arr.shape}".encode())
+        h.update(arr.view(np.uint8) if arr.size else b"")
+    return h.hexdigest()
+
+
+def make_key(stage: str, *parts: object) -> str:
+    """Cache key of a stage from its input fingerprints/keys and parameters."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((CACHE_VERSION, stage) + tuple(parts)).encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU store of NumPy arrays addressed by content keys."""
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root) if root is not None else default_cache_path()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._size = sum(f.stat().st_size for f in self.root.glob('*/*.npy'))
+
+    def _path(self, stage: str, key: str) -> Path:
+        return self.root / stage / f"{key}.npy"
+
+    def _count(self, stage: str, event: str, amount: int = 1) -> None:
+        with self._lock:
+            counts = self._stats.setdefault(stage, {'hits': 0, 'misses': 0, 'bytes_read': 0,
+                                                    'bytes_written': 0, 'evictions': 0})
+            counts[event] += amount
+
+    # --- ACCESS ---
+
+    def get(self, stage: str, key: str) -> Optional[np.ndarray]:
+        path = self._path(stage, key)
+        try:
+            value = np.load(path, allow_pickle=False)
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            self._count(stage, 'misses')
+            return None
+        self._count(stage, 'hits')
+        self._count(stage, 'bytes_read', value.nbytes)
+        return value
+
+    def put(self, stage: str, key: str, value: np.ndarray) -> None:
+        path = self._path(stage, key)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            np.save(fh, np.asarray(value), allow_pickle=False)
+        size = os.path.getsize(tmp)
+        try:
+            old_size = path.stat().st_size
+        except FileNotFoundError:
+            old_size = 0
+        os.replace(tmp, path)
+        # Gross bytes written; _size tracks the net change so overwrites don't inflate it
+        self._count(stage, 'bytes_written', size)
+        with self._lock:
+            self._size += size - old_size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def get_or_compute(self, stage: str, key: str, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """Returns the cached array for `key`, computing and storing it on a miss."""
+        value = self.get(stage, key)
+        if value is None:
+            value = np.asarray(compute())
+            self.put(stage, key, value)
+        return value
+
+    # --- MAINTENANCE ---
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """Deletes least recently used entries until the cache fits; returns entries removed."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = []
+        for f in self.root.glob('*/*.npy'):
+            try:
+                st = f.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, f))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, f in sorted(entries, key=lambda e: e[0]):
+            if total <= limit:
+                break
+            try:
+                f.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+            self._count(f.parent.name, 'evictions')
+        with self._lock:
+            self._size = total
+        return removed
+
+    def clear(self) -> None:
+        self.evict(max_bytes=0)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def stats(self) -> pd.DataFrame:
+        """Hits, misses, hit rate and bytes moved per stage."""
+        table = pd.DataFrame.from_dict(self._stats, orient='index')
+        if table.empty:
+            return table
+        table.index.name = 'stage'
+        table['hit_rate'] = table['hits'] / (table['hits'] + table['misses']).clip(lower=1)
+        return table
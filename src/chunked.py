@@ -0,0 +1,170 @@
+"""
+Out-of-Core Chunked Backtest
+----------------------------
+Runs the panel model over histories too long to hold in memory, such as
+decades of 1-minute bars. The memory-mapped Close matrix is read in
+blocks of `chunk_rows` bars. Each block is preceded by every symbol's
+last max(long_window, range_window + 1) bars from earlier blocks, which
+is exactly the state the SMA sums, the Daily_Range window and the
+prior-bar PnL term reach back for, however far back a gap pushes them.
+Each symbol's running bar count is carried across blocks for the burn-in
+rule.
+
+Per-symbol and per-sector PnL are streamed into stores on disk block by
+block, and mapped pages are released after every block, so peak memory
+depends on chunk_rows x symbols only. All window sums are integer-exact,
+so output is identical, bar for bar, to panel.run_panel_backtest over
+the same data for any chunk size.
+"""
+
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from engine import INITIAL_CAPITAL, TARGET_DAILY_VOL, NUM_ASSETS, RANGE_WINDOW, get_sector
+from models import pack_bars
+from panel import make_panel, panel_signals, panel_positions, panel_pnl
+from profiling import stage
+from store import MarketStore, StoreWriter, load_store, open_store, default_data_folder
+
+DEFAULT_CHUNK_ROWS = 65_536
+
+
+@dataclass
+class ChunkedResult:
+    """Disk-backed PnL of a chunked run (stores hold a single 'Net_PnL' field)."""
+    symbol_pnl: MarketStore
+    sector_pnl: MarketStore
+    chunks: int
+    chunk_rows: int
+    elapsed: float
+
+    def sector_frame(self) -> pd.DataFrame:
+        """Daily (per-bar) PnL per sector, loaded into memory."""
+        return pd.DataFrame(np.asarray(self.sector_pnl.field('Net_PnL')), index=self.sector_pnl.dates,
+                            columns=self.sector_pnl.symbols)
+
+
+def run_chunked_backtest(store: Optional[MarketStore] = None, out_path: Optional[Path] = None,
+                         chunk_rows: int = DEFAULT_CHUNK_ROWS, short_window: int = 20,
+                         long_window: int = 120, range_window: int = RANGE_WINDOW,
+                         capital: float = INITIAL_CAPITAL, num_assets: int = NUM_ASSETS,
+                         symbols: Optional[List[str]] = None, path: int = 0) -> Optional[ChunkedResult]:
+    """
+    Streams the full-universe backtest through fixed-size row blocks.
+
+    Args:
+        store: Price store (default data/market); may be far larger than RAM.
+        out_path: Output folder holding 'symbols' and 'sectors' PnL stores
+            (default data/chunked).
+        chunk_rows: Bars per block; memory grows linearly with it.
+    """
+    if store is None:
+        store = load_store()
+        if store is None:
+            return None
+    out_path = Path(out_path) if out_path is not None else default_data_folder() / 'chunked'
+    start = time.perf_counter()
+
+    universe = symbols if symbols is not None else store.symbols
+    selected = [s for s in universe if s in store and get_sector(s)]
+    position = {s: i for i, s in enumerate(store.symbols)}
+    cols = np.array([position[s] for s in selected], dtype=np.intp)
+    num_symbols = len(selected)
+
+    template = make_panel(store.dates[:0], selected, np.empty((0, num_symbols)),
+                          [store.decimals[s] for s in selected])
+    risk_per_asset = capital * TARGET_DAILY_VOL / np.sqrt(num_assets)
+    sectors = template.sector_matrix()
+
+    dates = store.dates
+    close_all = store.field('Close', path)
+    num_rows = len(dates)
+    halo = max(long_window, range_window + 1)
+
+    out_path.mkdir(parents=True, exist_ok=True)
+    symbol_writer = StoreWriter(out_path / 'symbols', dates, selected, [0.01] * num_symbols,
+                                [2] * num_symbols, fields=('Net_PnL',))
+    sector_writer = StoreWriter(out_path / 'sectors', dates, template.sector_names,
+                                [0.01] * len(template.sector_names), [2] * len(template.sector_names),
+                                fields=('Net_PnL',))
+
+    # Each symbol's last `halo` bars, right-aligned (NaN where it has fewer), and
+    # its bars before them. Every computation follows a symbol's own bars, so
+    # the carried rows need not share dates across symbols.
+    carry = np.full((halo, num_symbols), np.nan)
+    bars_before = np.zeros(num_symbols, dtype=np.int64)
+    chunks = 0
+    for r0 in range(0, num_rows, chunk_rows):
+        r1 = min(r0 + chunk_rows, num_rows)
+
+        with stage('load'):
+            close = np.vstack([carry, close_all[r0:r1][:, cols]])
+        valid = ~np.isnan(close)
+        ticks = np.rint(np.nan_to_num(close) * template.scale).astype(np.int64)
+
+        with stage('signals'):
+            signal = panel_signals(ticks, valid, short_window, long_window, bars_before)
+        with stage('sizing'):
+            pos_size = panel_positions(ticks, valid, template.scale, template.multiplier, template.caps,
+                                       risk_per_asset, range_window)
+        with stage('pnl'):
+            pnl = panel_pnl(close, signal, pos_size, template.multiplier)[halo:]
+
+        with stage('write'):
+            symbol_writer.write('Net_PnL', pnl, rows=slice(r0, r1))
+            sector_writer.write('Net_PnL', pnl @ sectors, rows=slice(r0, r1))
+
+        # Keep RSS at one block: mapped input and output pages are dropped once consumed
+        store.release()
+        symbol_writer.release()
+        sector_writer.release()
+
+        recent, recent_valid, _ = pack_bars(close[::-1], valid[::-1])
+        kept = min(halo, recent.shape[0])
+        carry = np.full((halo, num_symbols), np.nan)
+        carry[halo - kept:] = np.where(recent_valid[:kept], recent[:kept], np.nan)[::-1]
+        bars_before += valid.sum(axis=0) - recent_valid[:kept].sum(axis=0)
+        chunks += 1
+
+    return ChunkedResult(symbol_pnl=symbol_writer.close(), sector_pnl=sector_writer.close(),
+                         chunks=chunks, chunk_rows=chunk_rows, elapsed=time.perf_counter() - start)
+
+
+def generate_minute_store(num_bars: int, store_path: Optional[Path] = None, num_symbols: Optional[int] = None,
+                          seed: Optional[int] = 0) -> MarketStore:
+    """Writes a synthetic 1-minute history of `num_bars` bars (data/minute by default)."""
+    from generator import ANCHORS, expand_anchors, generate_paths
+
+    store_path = Path(store_path) if store_path is not None else default_data_folder() / 'minute'
+    dates = pd.date_range('2000-01-03 09:30', periods=num_bars, freq='min', name='Date')
+    anchors = expand_anchors(num_symbols) if num_symbols else ANCHORS
+    return generate_paths(anchors, seed=seed, store_path=store_path, dates=dates)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Out-of-core chunked backtest")
+    parser.add_argument('--store', type=Path, default=None, help="price store (default data/market)")
+    parser.add_argument('--out', type=Path, default=None, help="output folder (default data/chunked)")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--generate-minutes', type=int, default=None, metavar='BARS',
+                        help="first write a synthetic minute-bar store of BARS bars to --store (default data/minute)")
+    args = parser.parse_args()
+
+    if args.generate_minutes:
+        source = generate_minute_store(args.generate_minutes, args.store)
+    else:
+        source = open_store(args.store) if args.store else load_store()
+    if source is None:
+        print("No market data found; run generator.py first")
+    else:
+        result = run_chunked_backtest(source, args.out, args.chunk_rows)
+        totals = result.sector_frame().sum()
+        print(totals.round(2).to_string())
+        print(f"\n{len(source.dates):,} bars x {len(result.symbol_pnl.symbols)} symbols in {result.chunks} chunks "
+              f"| {result.elapsed:.2f}s | PnL stores in {result.symbol_pnl.path.parent}")
@@ -0,0 +1,179 @@
+"""
+Low-Memory Compact Mode
+-----------------------
+Memory-lean variant of the serial per-market engine. Instead of copying
+each market into a DataFrame and growing it column by column (SMA20,
+SMA120, Signal, Daily_Range, Pos_Size, Net_PnL) and then holding every
+Net_PnL series until the final concat, each market is evaluated on bare
+arrays in compact dtypes and folded straight into a (dates x sectors)
+accumulator:
+
+    Close       float32 where every price is exactly recoverable on its
+                tick grid (else float64), read from the store column
+    Signal      int8
+    Pos_Size    int16
+    Net_PnL     added to the sector accumulator, then discarded
+
+Window sums run on integer ticks like panel.py, so results differ from
+the float64 pandas path only where that path resolves an exact SMA tie
+through rounding noise. pnl_drift() reports those differences.
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from engine import (SECTORS, INITIAL_CAPITAL, TARGET_DAILY_VOL, NUM_ASSETS, RANGE_WINDOW,
+                    get_sector, get_sector_cap, get_contract_terms)
+from models import cumulative, window_sum
+from profiling import stage
+from store import MarketStore, load_store
+
+# float32 holds integers up to 2**24 exactly; staying below 2**22 ticks keeps
+# the rounding error of price * scale under a quarter tick
+_FLOAT32_MAX_TICKS = 2 ** 22
+
+
+def compact_prices(close: np.ndarray, decimals: int) -> np.ndarray:
+    """Downcasts prices to float32 when every value maps back to its exact tick."""
+    if close.size and np.nanmax(np.abs(close)) * 10 ** decimals < _FLOAT32_MAX_TICKS:
+        return close.astype(np.float32)
+    return np.asarray(close, dtype=np.float64)
+
+
+def compact_symbol(close: np.ndarray, scale: int, multiplier: float, cap: float, risk_per_asset: float,
+                   short_window: int = 20, long_window: int = 120,
+                   range_window: int = RANGE_WINDOW) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Serial-engine logic for one market's consecutive bars.
+
+    Returns:
+        (signal int8, pos_size int16, net_pnl float64), one entry per bar.
+    """
+    n = close.size
+    ticks = np.rint(np.multiply(close, scale, dtype=np.float64)).astype(np.int64)
+    cs, cnt = cumulative(ticks, np.ones(n, dtype=bool))
+
+    # SMA crossover on exact window sums, neutralized for the first long_window bars
+    s_sum, _ = window_sum(cs, cnt, short_window)
+    l_sum, _ = window_sum(cs, cnt, long_window)
+    signal = np.zeros(n, dtype=np.int8)
+    live = slice(long_window, None)
+    signal[live] = np.where(long_window * s_sum[live] > short_window * l_sum[live], 1, -1)
+    del cs, cnt, s_sum, l_sum
+
+    # Daily_Range from the rolling sum of absolute tick moves
+    moves = np.zeros(n, dtype=np.int64)
+    np.abs(np.diff(ticks), out=moves[1:])
+    mcs, mcnt = cumulative(moves, np.ones(n, dtype=bool))
+    range_sum, _ = window_sum(mcs, mcnt, range_window)
+    del mcs, mcnt, moves
+
+    pos = np.zeros(n, dtype=np.float64)
+    sized = slice(range_window, None)
+    daily_range = range_sum[sized] / (range_window * scale)
+    with np.errstate(divide='ignore'):
+        np.divide(risk_per_asset, daily_range * multiplier, out=pos[sized], where=daily_range > 0)
+    pos_size = np.round(np.clip(pos, 0, cap)).astype(np.int16)
+    del pos, range_sum, daily_range
+
+    pnl = np.zeros(n, dtype=np.float64)
+    pnl[1:] = np.diff(ticks) / scale * multiplier * pos_size[1:] * signal[:-1]
+    return signal, pos_size, pnl
+
+
+def compact_sector_pnls(store: Optional[MarketStore] = None, short_window: int = 20,
+                        long_window: int = 120, range_window: int = RANGE_WINDOW,
+                        capital: float = INITIAL_CAPITAL,
+                        num_assets: int = NUM_ASSETS) -> Optional[pd.DataFrame]:
+    """
+    Sector daily PnL in the layout of backtest.aggregate_sector_pnls,
+    computed one market at a time into a single float64 accumulator.
+    """
+    if store is None:
+        store = load_store()
+        if store is None:
+            return None
+    risk_per_asset = capital * TARGET_DAILY_VOL / np.sqrt(num_assets)
+    traded = [s for s in store.symbols if get_sector(s)]
+    sector_names = [s for s in SECTORS if any(get_sector(sym) == s for sym in traded)]
+    if not sector_names:
+        return None
+
+    dates = store.dates
+    totals = np.zeros((len(dates), len(sector_names)))
+    any_bar = np.zeros(len(dates), dtype=bool)
+
+    for symbol in traded:
+        with stage('load', symbol=symbol):
+            column = store.column(symbol)
+            rows = np.flatnonzero(~np.isnan(column))
+            close = compact_prices(column[rows], store.decimals[symbol])
+        tick_size, tick_val = get_contract_terms(symbol)
+        sector = get_sector(symbol)
+        with stage('compact_symbol', symbol=symbol):
+            _, _, pnl = compact_symbol(close, 10 ** store.decimals[symbol], tick_val / tick_size,
+                                       get_sector_cap(sector), risk_per_asset, short_window,
+                                       long_window, range_window)
+        totals[rows, sector_names.index(sector)] += pnl
+        any_bar[rows] = True
+
+    return pd.DataFrame(totals[any_bar], index=dates[any_bar], columns=sector_names)
+
+
+def pnl_drift(reference: pd.DataFrame, candidate: pd.DataFrame) -> pd.DataFrame:
+    """Per-sector difference of a candidate run against the float64 reference."""
+    candidate = candidate.reindex_like(reference).fillna(0)
+    diff = candidate - reference
+    table = pd.DataFrame({
+        'reference_total': reference.sum(),
+        'candidate_total': candidate.sum(),
+        'total_diff': diff.sum(),
+        'max_abs_daily_diff': diff.abs().max(),
+        'days_differing': (diff.abs() > 1e-6).sum(),
+    })
+    table.loc['TOTAL'] = [reference.sum().sum(), candidate.sum().sum(), diff.sum().sum(),
+                          diff.sum(axis=1).abs().max(), (diff.sum(axis=1).abs() > 1e-6).sum()]
+    return table
+
+
+# --- MEMORY COMPARISON ---
+
+def _measure(mode: str) -> Dict[str, object]:
+    import resource
+    import tracemalloc
+    from report import compute_sector_pnls
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = compact_sector_pnls() if mode == 'compact' else compute_sector_pnls('serial')
+    elapsed = time.perf_counter() - start
+    traced_peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {'mode': mode, 'seconds': elapsed, 'peak_rss_mb': peak, 'rss_above_imports_mb': peak - baseline,
+            'traced_peak_mb': traced_peak, 'result': result}
+
+
+def compare_modes() -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Runs the float64 serial path and compact mode in fresh processes; returns (memory, drift)."""
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    runs = []
+    for mode in ('serial', 'compact'):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            runs.append(pool.submit(_measure, mode).result())
+    memory = pd.DataFrame([{k: v for k, v in r.items() if k != 'result'} for r in runs]).set_index('mode')
+    return memory, pnl_drift(runs[0]['result'], runs[1]['result'])
+
+
+if __name__ == "__main__":
+    pd.set_option('display.width', 160)
+    memory, drift = compare_modes()
+    print(memory.round(2))
+    print()
+    print(drift.round(2))
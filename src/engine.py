@@ -6,7 +6,7 @@ This module maps exchange-traded symbols to their specific mechanical
 properties for accurate PnL and risk calculations.
 """
 
-from typing import Optional
+from typing import Optional, Tuple
 
 # Symbol-specific mechanical specifications
 CONTRACT_SPECS = {
@@ -80,6 +80,56 @@ CONTRACT_SPECS = {
     'O':  {'name': 'Oats', 'tick': 0.25, 'bpv': 50},
 }
 
+# Sector membership used for attribution and exposure caps
+SECTORS = {
+    'Equity Indices': ['ES', 'NQ', 'YM', 'RTY', 'EMD', 'M2K', 'MES', 'MNQ', 'MYM', 'SP', 'NK', 'NIY', 'DAX', 'FTSE',
+                       'NKY', 'STXE'],
+    'Rates and Bonds': ['US', 'TY', 'FV', 'TU', 'ZN', 'ZB', 'ZT', 'ZF', 'ED', 'FF', 'FGBL', 'CONF', 'JGB', 'FGBM',
+                        'FGBX', 'FGBS'],
+    'Metals': ['GC', 'SI', 'HG', 'PL', 'PA'],
+    'Energies': ['CL', 'QM', 'NG', 'RB', 'HO', 'QH', 'QU'],
+    'Agriculture': ['C', 'S', 'W', 'SB'],
+    'Currencies': ['AD', 'CD', 'EC', 'BP', 'JY', 'MP1', 'NE1', 'SF', 'DX']
+}
+
+_SYMBOL_SECTOR = {sym: sector for sector, syms in SECTORS.items() for sym in syms}
+
+# Portfolio risk budgeting defaults
+INITIAL_CAPITAL = 10_000_000
+TARGET_DAILY_VOL = 0.0030
+NUM_ASSETS = 57
+RANGE_WINDOW = 40
+
+
+def root_symbol(symbol: str) -> str:
+    """
+    Strips a synthetic clone suffix ('ES.12' -> 'ES'). Clones let large
+    simulated universes inherit the sector and contract terms of a root market.
+    """
+    return symbol.split('.', 1)[0]
+
+
+def get_sector(symbol: str) -> Optional[str]:
+    """Returns the sector a symbol belongs to, or None if it is not traded."""
+    return _SYMBOL_SECTOR.get(root_symbol(symbol))
+
+
+def get_sector_cap(sector: str) -> int:
+    """Maximum contracts held per market within a sector (exposure cap)."""
+    return 4 if sector == 'Currencies' else 1 if sector == 'Equity Indices' else 15
+
+
+def get_contract_terms(symbol: str) -> Tuple[float, float]:
+    """
+    Returns (tick_size, tick_value) for PnL and sizing, falling back to a
+    generic 0.01 / $10.00 contract when the symbol is not listed.
+    """
+    spec = CONTRACT_SPECS.get(root_symbol(symbol))
+    if spec:
+        return spec['tick'], get_tick_value(root_symbol(symbol))
+    return 0.01, 10.00
+
+
 def get_tick_value(symbol: str) -> Optional[float]:
     """
     Returns the dollar value of a single tick (Tick Size * BPV).
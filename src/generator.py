@@ -3,103 +3,294 @@ Synthetic History Generator
 ---------------------------
 Constructs multi-asset price series with endpoint convergence
 for historical simulation and strategy stress-testing.
+
+Series are simulated in batches as (paths x dates x symbols) arrays from a
+seeded np.random.Generator and streamed into the binary market store, so
+universes of thousands of symbols or thousands of Monte-Carlo paths are
+produced in bounded memory.
 """
 
 import pandas as pd
 import numpy as np
 import os
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-def generate_synthetic_history():
-    script_dir = Path(__file__).resolve().parent
-    data_folder = script_dir.parent / 'data'
-    if data_folder.exists():
-        shutil.rmtree(data_folder)
-    os.makedirs(data_folder, exist_ok=True)
+from engine import root_symbol
+from store import FIELDS, MarketStore, StoreWriter, export_csv_folder
+
+ANCHORS = {
+    'ES': (1469, 6875), 'NQ': (3790, 24750), 'YM': (11350, 49600), 'RTY': (1100, 2644),
+    'EMD': (1200, 3200), 'M2K': (1100, 2644), 'MES': (1469, 6875), 'MNQ': (3790, 24750),
+    'MYM': (11350, 49600), 'SP': (1400, 6875), 'NK': (10000, 38500), 'NIY': (10000, 38500),
+    'DAX': (6000, 18500), 'FTSE': (5000, 8400), 'NKY': (10000, 38500), 'STXE': (2500, 5200),
+    'US': (100.0, 130.0), 'TY': (100.0, 115.0), 'FV': (100.0, 112.0), 'TU': (100.0, 105.0),
+    'ZN': (80.0, 113.0), 'ZB': (70.0, 122.0), 'ZT': (100.0, 106.0), 'ZF': (95.0, 110.0),
+    'ED': (94.0, 97.0), 'FF': (95.0, 96.5), 'FGBL': (110.0, 135.0), 'CONF': (110.0, 140.0),
+    'JGB': (130.0, 145.0), 'FGBM': (110.0, 125.0), 'FGBX': (100.0, 150.0), 'FGBS': (100.0, 105.0),
+    'GC': (288.0, 5030.0), 'SI': (5.30, 76.50), 'HG': (0.80, 5.75), 'PL': (600, 1100), 'PA': (400, 1200),
+    'CL': (25.6, 63.8), 'QM': (25.0, 60.0), 'NG': (1.80, 3.10), 'RB': (0.80, 1.92),
+    'HO': (0.80, 2.41), 'QH': (0.80, 2.41), 'QU': (0.80, 1.92),
+    'C': (210.0, 480.0), 'S': (500.0, 1150.0), 'W': (300.0, 620.0), 'SB': (10.0, 25.0),
+    'AD': (0.50, 0.68), 'CD': (0.60, 0.72), 'EC': (0.90, 1.08), 'BP': (1.20, 1.25),
+    'JY': (0.006, 0.0065), 'MP1': (0.04, 0.05), 'NE1': (0.45, 0.60), 'SF': (0.60, 0.88), 'DX': (80.0, 104.5)
+}
+
+# Asset class identification sets
+EQUITY_SYMS = {'ES', 'NQ', 'YM', 'RTY', 'EMD', 'M2K', 'MES', 'MNQ', 'MYM', 'SP', 'NK', 'NIY', 'DAX', 'FTSE', 'NKY', 'STXE'}
+METAL_SYMS = {'GC', 'SI', 'HG', 'PL', 'PA'}
+BOND_SYMS = {'US', 'TY', 'FV', 'TU', 'ZN', 'ZB', 'ZT', 'ZF', 'FGBL', 'CONF', 'JGB', 'FGBM', 'FGBX', 'FGBS'}
+FX_SYMS = {'AD', 'CD', 'EC', 'BP', 'NE1', 'SF'}
+
+# Harmonic profile per class: 0 = equity, 1 = metal, 2 = other
+EQUITY, METAL, OTHER = 0, 1, 2
 
+DEFAULT_CHUNK_BYTES = 256 * 2 ** 20
+
+
+def history_dates() -> pd.DatetimeIndex:
+    """Business days from 2000-01-01 through the most recent Friday."""
     today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     offset = (today.weekday() - 4) % 7
     last_friday = today - timedelta(days=offset)
+    return pd.date_range(start='2000-01-01', end=last_friday, freq='B')
 
-    dates = pd.date_range(start='2000-01-01', end=last_friday, freq='B')
-    num_days = len(dates)
 
-    anchors = {
-        'ES': (1469, 6875), 'NQ': (3790, 24750), 'YM': (11350, 49600), 'RTY': (1100, 2644),
-        'EMD': (1200, 3200), 'M2K': (1100, 2644), 'MES': (1469, 6875), 'MNQ': (3790, 24750),
-        'MYM': (11350, 49600), 'SP': (1400, 6875), 'NK': (10000, 38500), 'NIY': (10000, 38500),
-        'DAX': (6000, 18500), 'FTSE': (5000, 8400), 'NKY': (10000, 38500), 'STXE': (2500, 5200),
-        'US': (100.0, 130.0), 'TY': (100.0, 115.0), 'FV': (100.0, 112.0), 'TU': (100.0, 105.0),
-        'ZN': (80.0, 113.0), 'ZB': (70.0, 122.0), 'ZT': (100.0, 106.0), 'ZF': (95.0, 110.0),
-        'ED': (94.0, 97.0), 'FF': (95.0, 96.5), 'FGBL': (110.0, 135.0), 'CONF': (110.0, 140.0),
-        'JGB': (130.0, 145.0), 'FGBM': (110.0, 125.0), 'FGBX': (100.0, 150.0), 'FGBS': (100.0, 105.0),
-        'GC': (288.0, 5030.0), 'SI': (5.30, 76.50), 'HG': (0.80, 5.75), 'PL': (600, 1100), 'PA': (400, 1200),
-        'CL': (25.6, 63.8), 'QM': (25.0, 60.0), 'NG': (1.80, 3.10), 'RB': (0.80, 1.92),
-        'HO': (0.80, 2.41), 'QH': (0.80, 2.41), 'QU': (0.80, 1.92),
-        'C': (210.0, 480.0), 'S': (500.0, 1150.0), 'W': (300.0, 620.0), 'SB': (10.0, 25.0),
-        'AD': (0.50, 0.68), 'CD': (0.60, 0.72), 'EC': (0.90, 1.08), 'BP': (1.20, 1.25),
-        'JY': (0.006, 0.0065), 'MP1': (0.04, 0.05), 'NE1': (0.45, 0.60), 'SF': (0.60, 0.88), 'DX': (80.0, 104.5)
-    }
-
-    # Bond identification list
-    bond_syms = ['US', 'TY', 'FV', 'TU', 'ZN', 'ZB', 'ZT', 'ZF', 'FGBL', 'CONF', 'JGB', 'FGBM', 'FGBX', 'FGBS']
-
-    for symbol, (start_val, target_val) in anchors.items():
+def expand_anchors(num_symbols: int) -> Dict[str, Tuple[float, float]]:
+    """
+    Anchor table for a universe of `num_symbols`: the base markets first,
+    then synthetic clones ('ES.1', 'NQ.1', ...) cycling through them.
+    """
+    base = list(ANCHORS.items())
+    anchors = {}
+    for i in range(num_symbols):
+        symbol, anchor = base[i % len(base)]
+        anchors[symbol if i < len(base) else f"{symbol}.{i // len(base)}"] = anchor
+    return anchors
+
+
+def _symbol_profile(symbol: str) -> Tuple[int, float, float, int]:
+    """Returns (class, base_vol, tick, decimals) for a (possibly cloned) symbol."""
+    root = root_symbol(symbol)
+    is_bond = root in BOND_SYMS
+
+    if root in EQUITY_SYMS:
+        kind, base_vol = EQUITY, 0.06
+    elif root in METAL_SYMS:
+        kind, base_vol = METAL, 0.085
+    else:
+        kind, base_vol = OTHER, 0.05 if is_bond else 0.08
+
+    # Precision logic updated for all Bond symbols
+    if root == 'JY':
+        tick, decimals = 0.000001, 6
+    elif root in FX_SYMS:
+        tick, decimals = 0.0001, 4
+    elif is_bond:
+        tick, decimals = 0.03125, 5
+    elif any(s in root for s in ['ES', 'NQ', 'C', 'S', 'W']):
+        tick, decimals = 0.25, 2
+    else:
+        tick, decimals = 0.01, 2
+
+    return kind, base_vol, tick, decimals
+
+
+class _Universe:
+    """Per-symbol simulation parameters as column vectors."""
+
+    def __init__(self, anchors: Dict[str, Tuple[float, float]], num_days: int):
+        self.symbols: List[str] = list(anchors)
+        profiles = [_symbol_profile(s) for s in self.symbols]
+        self.start = np.array([a[0] for a in anchors.values()], dtype=np.float64)
+        self.target = np.array([a[1] for a in anchors.values()], dtype=np.float64)
+        self.kind = np.array([p[0] for p in profiles], dtype=np.intp)
+        self.base_vol = np.array([p[1] for p in profiles])
+        self.tick = np.array([p[2] for p in profiles])
+        self.decimals = np.array([p[3] for p in profiles], dtype=np.int64)
+
         t = np.linspace(0, 1, num_days)
-        is_equity = symbol in ['ES', 'NQ', 'YM', 'RTY', 'EMD', 'M2K', 'MES', 'MNQ', 'MYM', 'SP', 'NK', 'NIY', 'DAX', 'FTSE', 'NKY', 'STXE']
-        is_metal = symbol in ['GC', 'SI', 'HG', 'PL', 'PA']
-        is_bond = any(s == symbol for s in bond_syms)
-
-        drift = start_val + (target_val - start_val) * t
-
-        if is_equity:
-            harmonics = (np.sin(t * 6 * np.pi) * 0.04 +
-                        np.sin(t * 25 * np.pi) * 0.03) * (0.7 + t * 0.5)
-            base_vol = 0.06
-        elif is_metal:
-            harmonics = (np.sin(t * 20 * np.pi) * 0.08 +
-                        np.sin(t * 60 * np.pi) * 0.05) * (0.6 + t * 0.4)
-            base_vol = 0.085
-        else:
-            harmonics = np.sin(t * 40 * np.pi) * 0.07
-            base_vol = 0.05 if is_bond else 0.08
-
-        vol_ramp = 1.3 + (t * 2.2)
-        stochastic_walk = np.cumsum(np.random.normal(0, base_vol, num_days)) * vol_ramp
-
-        raw_series = drift * (1 + harmonics) + (stochastic_walk * start_val * 0.20)
-
-        error = raw_series[-1] - target_val
-        adjustment = t * error
-        final_series = raw_series - adjustment
-        final_series = np.maximum(final_series, start_val * 0.05)
-
-        # Precision logic updated for all Bond symbols
-        if symbol == 'JY':
-            tick, decimals = 0.000001, 6
-        elif symbol in ['AD', 'CD', 'EC', 'BP', 'NE1', 'SF']:
-            tick, decimals = 0.0001, 4
-        elif is_bond:
-            tick, decimals = 0.03125, 5
-        elif any(s in symbol for s in ['ES', 'NQ', 'C', 'S', 'W']):
-            tick, decimals = 0.25, 2
-        else:
-            tick, decimals = 0.01, 2
-
-        final_series = np.round(final_series / tick) * tick
-        final_series[-1] = target_val
-
-        df = pd.DataFrame({'Date': dates, 'Open': final_series, 'High': final_series + tick,
-                           'Low': final_series - tick, 'Close': final_series})
-
-        for col in ['Open', 'High', 'Low', 'Close']:
-            df[col] = df[col].apply(lambda x: f"{x:.{decimals}f}")
-
-        df.to_csv(data_folder / f"{symbol}.csv", index=False)
+        self.t = t
+        self.vol_ramp = 1.3 + (t * 2.2)
+        self.harmonics = np.column_stack([
+            (np.sin(t * 6 * np.pi) * 0.04 + np.sin(t * 25 * np.pi) * 0.03) * (0.7 + t * 0.5),
+            (np.sin(t * 20 * np.pi) * 0.08 + np.sin(t * 60 * np.pi) * 0.05) * (0.6 + t * 0.4),
+            np.sin(t * 40 * np.pi) * 0.07,
+        ])
+
+
+def simulate_block(universe: _Universe, cols: slice, noise: np.ndarray) -> np.ndarray:
+    """
+    Converts daily shocks of shape (paths x dates x block), already scaled
+    by each symbol's base volatility, into tick-rounded closes that start at each anchor and converge to its target.
+    """
+    t = universe.t[None, :, None]
+    start, target = universe.start[cols], universe.target[cols]
+    tick = universe.tick[cols]
+
+    drift = start + (target - start) * t
+    harmonics = universe.harmonics[:, universe.kind[cols]][None]
+
+    stochastic_walk = np.cumsum(noise, axis=1) * universe.vol_ramp[None, :, None]
+    raw_series = drift * (1 + harmonics) + (stochastic_walk * start * 0.20)
+
+    error = raw_series[:, -1, :] - target
+    final_series = raw_series - t * error[:, None, :]
+    final_series = np.maximum(final_series, start * 0.05)
+
+    final_series = np.round(final_series / tick) * tick
+    final_series[:, -1, :] = target
+    return final_series
+
+
+def _draw_noise(rngs: List[np.random.Generator], vols: np.ndarray, num_paths: int, num_days: int) -> np.ndarray:
+    # Per-symbol streams, consumed path by path, keep output independent of batching
+    return np.stack([rng.normal(0, vol, (num_paths, num_days)) for rng, vol in zip(rngs, vols)], axis=-1)
+
+
+def _round_to(values: np.ndarray, decimals: np.ndarray) -> np.ndarray:
+    # Same arithmetic as np.round(values, d), vectorized over per-column decimals
+    factor = 10.0 ** decimals
+    return np.rint(values * factor) / factor
+
+
+def generate_paths(anchors: Optional[Dict[str, Tuple[float, float]]] = None, num_paths: int = 1,
+                   seed: Optional[int] = None, store_path: Optional[Path] = None,
+                   dates: Optional[pd.DatetimeIndex] = None, workers: Optional[int] = None,
+                   chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> MarketStore:
+    """
+    Simulates every symbol and path and streams them into a store.
+
+    Each symbol draws from its own child of SeedSequence(seed), so output
+    is reproducible for a seed regardless of chunking or worker count.
+    Symbols are processed in blocks sized to `chunk_bytes` per worker and
+    blocks run on a thread pool (NumPy releases the GIL in the bulk math).
+    A single path writes the full OHLC layout; multi-path stores hold
+    (paths x dates x symbols) Close only.
+    """
+    anchors = anchors if anchors is not None else ANCHORS
+    dates = dates if dates is not None else history_dates()
+    store_path = Path(store_path) if store_path is not None else Path(__file__).resolve().parent.parent / 'data' / 'market'
+    workers = workers or os.cpu_count() or 1
+
+    num_days = len(dates)
+    universe = _Universe(anchors, num_days)
+    num_symbols = len(universe.symbols)
+    seeds = np.random.SeedSequence(seed).spawn(num_symbols)
+
+    # Roughly six float64 temporaries of the block are alive at once
+    per_column = num_paths * num_days * 8 * 6
+    block = max(1, min(num_symbols, chunk_bytes // (per_column * workers)))
+    path_block = num_paths if per_column <= chunk_bytes else max(1, chunk_bytes // (num_days * 8 * 6))
+
+    fields = FIELDS if num_paths == 1 else ('Close',)
+    writer = StoreWriter(store_path, dates, universe.symbols, universe.tick, universe.decimals,
+                         fields=fields, paths=num_paths)
+
+    def run_block(lo: int) -> None:
+        cols = slice(lo, min(lo + block, num_symbols))
+        rngs = [np.random.default_rng(s) for s in seeds[cols]]
+        decimals = universe.decimals[cols]
+        for p0 in range(0, num_paths, path_block):
+            paths = slice(p0, min(p0 + path_block, num_paths))
+            noise = _draw_noise(rngs, universe.base_vol[cols], paths.stop - paths.start, num_days)
+            final_series = simulate_block(universe, cols, noise)
+
+            # Stored at printed precision so store and CSV readers see identical values
+            close = _round_to(final_series, decimals)
+            if num_paths == 1:
+                tick = universe.tick[cols]
+                writer.write('Open', close[0], cols)
+                writer.write('High', _round_to(final_series[0] + tick, decimals), cols)
+                writer.write('Low', _round_to(final_series[0] - tick, decimals), cols)
+                writer.write('Close', close[0], cols)
+            else:
+                writer.write('Close', close, cols, paths)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run_block, range(0, num_symbols, block)))
+
+    return writer.close()
+
+
+def iter_path_batches(anchors: Optional[Dict[str, Tuple[float, float]]] = None, num_paths: int = 1,
+                      seed: Optional[int] = None, dates: Optional[pd.DatetimeIndex] = None,
+                      batch_size: int = 16) -> Iterator[np.ndarray]:
+    """
+    In-memory counterpart of generate_paths: yields Close batches of shape
+    (batch x dates x symbols) covering all symbols. For the same seed the
+    paths are identical to those written by generate_paths.
+    """
+    anchors = anchors if anchors is not None else ANCHORS
+    dates = dates if dates is not None else history_dates()
+    universe = _Universe(anchors, len(dates))
+    rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(len(universe.symbols))]
+    everything = slice(None)
+
+    for p0 in range(0, num_paths, batch_size):
+        n = min(batch_size, num_paths - p0)
+        noise = _draw_noise(rngs, universe.base_vol, n, len(dates))
+        yield _round_to(simulate_block(universe, everything, noise), universe.decimals)
+
+
+def universe_decimals(anchors: Optional[Dict[str, Tuple[float, float]]] = None) -> List[int]:
+    """Printed decimals per symbol, as recorded in the store metadata."""
+    anchors = anchors if anchors is not None else ANCHORS
+    return [_symbol_profile(s)[3] for s in anchors]
+
+
+def remove_stale_csvs(data_folder: Path, symbols: Iterable[str]) -> List[str]:
+    """
+    Deletes legacy <SYM>.csv files in `data_folder` whose symbol is not in
+    `symbols` (the markets about to be re-exported), so no CSV describing an
+    earlier universe or earlier paths is left for the CSV fallback or
+    import_csv_folder to load. Returns the removed symbols.
+    """
+    keep = set(symbols)
+    stale = sorted(f[:-4] for f in os.listdir(data_folder) if f.endswith('.csv') and f[:-4] not in keep)
+    for symbol in stale:
+        os.remove(Path(data_folder) / f"{symbol}.csv")
+    return stale
+
+
+def generate_synthetic_history(write_csv: bool = False, seed: Optional[int] = None,
+                               num_symbols: Optional[int] = None, num_paths: int = 1,
+                               workers: Optional[int] = None):
+    """
+    Builds the synthetic universe and writes it to the binary market store
+    (data/market). Per-symbol CSV files are only written when `write_csv`
+    is set, for tools that still expect the legacy layout. Multi-path runs
+    go to data/paths so the backtest dataset is left untouched.
+    """
+    script_dir = Path(__file__).resolve().parent
+    data_folder = script_dir.parent / 'data'
+    os.makedirs(data_folder, exist_ok=True)
+
+    anchors = expand_anchors(num_symbols) if num_symbols else ANCHORS
+    store_path = data_folder / ('market' if num_paths == 1 else 'paths')
+    dates = history_dates()
+
+    store = generate_paths(anchors, num_paths, seed, store_path, dates, workers)
+    if num_paths == 1:
+        # CSVs are only rewritten with --csv; any left over would disagree with the new store
+        removed = remove_stale_csvs(data_folder, anchors if write_csv else ())
+        if removed:
+            print(f"Removed {len(removed)} CSV files that no longer match the store")
+        if write_csv:
+            export_csv_folder(store, data_folder)
 
     print(f"Dataset Generation Complete | Terminal Date: {dates[-1].strftime('%Y-%m-%d')}")
 
 if __name__ == "__main__":
-    generate_synthetic_history()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Synthetic futures history generator")
+    parser.add_argument('--csv', action='store_true', help="also export legacy per-symbol CSV files")
+    parser.add_argument('--seed', type=int, default=None, help="seed for reproducible output")
+    parser.add_argument('--symbols', type=int, default=None, help="universe size (clones beyond the 57 base markets)")
+    parser.add_argument('--paths', type=int, default=1, help="independent Monte-Carlo paths per symbol")
+    parser.add_argument('--workers', type=int, default=None, help="threads (default: all cores)")
+    args = parser.parse_args()
+    generate_synthetic_history(write_csv=args.csv, seed=args.seed, num_symbols=args.symbols,
+                               num_paths=args.paths, workers=args.workers)
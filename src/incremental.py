@@ -0,0 +1,344 @@
+"""
+Incremental Daily-Update Engine
+-------------------------------
+Stateful end-of-day engine that carries the running window sums of the
+trend model and the volatility sizer, the last signal and position, and
+cumulative equity for every symbol. Each new bar is absorbed in constant
+time per symbol instead of recomputing the full history.
+
+Window sums are kept on integer-scaled prices exactly like panel.py, so
+every signal, position and PnL value is identical to a full panel
+recompute over the same bars. Portfolio statistics for each sector and
+the total are carried alongside the state (metrics.StreamingMetrics) and
+extended by the new days only.
+
+Each symbol advances along its own bars, as the serial and panel
+engines count them: a date without a bar is skipped and the next bar's
+windows and PnL reach back to the previous bar. Each symbol also keeps
+its own last applied date, so a market whose bars arrive late still has
+them applied on a later run, in order. The streamed statistics cannot
+revise days already absorbed, so PnL dated on or before the previous
+run's latest date is booked on the next new day. The state covers a
+fixed universe; when the store gains or loses markets, run_daily_update
+refuses to apply new bars until the state is rebuilt (rebuild=True, or
+--rebuild).
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from engine import INITIAL_CAPITAL, TARGET_DAILY_VOL, NUM_ASSETS, RANGE_WINDOW
+from metrics import StreamingMetrics
+from panel import Panel, build_panel, panel_signals, panel_positions, panel_pnl, run_panel_backtest
+from store import default_data_folder
+
+
+class IncrementalEngine:
+    """
+    Rolling state for a fixed universe. Bars for any subset of symbols can
+    be applied per call; each symbol advances along its own bar sequence.
+    """
+
+    _ARRAYS = ('scale', 'multiplier', 'caps', 'sector_codes', 'bars', 'price_ring', 'move_ring',
+               'short_sum', 'long_sum', 'range_sum', 'last_tick', 'last_close', 'signal',
+               'pos_size', 'last_pnl', 'equity', 'last_dates', 'late_pnl')
+
+    def __init__(self, symbols: Sequence[str], scale: np.ndarray, multiplier: np.ndarray,
+                 caps: np.ndarray, sector_codes: np.ndarray, sector_names: Sequence[str],
+                 short_window: int = 20, long_window: int = 120, range_window: int = RANGE_WINDOW,
+                 capital: float = INITIAL_CAPITAL, num_assets: int = NUM_ASSETS):
+        if not 0 < short_window < long_window:
+            raise ValueError(f"Need 0 < short_window < long_window, got {short_window}/{long_window}")
+        n = len(symbols)
+        self.symbols = list(symbols)
+        self.sector_names = list(sector_names)
+        self.short_window, self.long_window, self.range_window = short_window, long_window, range_window
+        self.capital, self.num_assets = capital, num_assets
+        self.risk_per_asset = capital * TARGET_DAILY_VOL / np.sqrt(num_assets)
+        self.last_date: Optional[pd.Timestamp] = None
+        self._index = {sym: i for i, sym in enumerate(self.symbols)}
+
+        self.scale = np.asarray(scale, dtype=np.int64)
+        self.multiplier = np.asarray(multiplier, dtype=np.float64)
+        self.caps = np.asarray(caps, dtype=np.float64)
+        self.sector_codes = np.asarray(sector_codes, dtype=np.intp)
+
+        # Rolling state: ring buffers hold the last long_window prices and range_window moves
+        self.bars = np.zeros(n, dtype=np.int64)
+        self.price_ring = np.zeros((long_window, n), dtype=np.int64)
+        self.move_ring = np.zeros((range_window, n), dtype=np.int64)
+        self.short_sum = np.zeros(n, dtype=np.int64)
+        self.long_sum = np.zeros(n, dtype=np.int64)
+        self.range_sum = np.zeros(n, dtype=np.int64)
+        self.last_tick = np.zeros(n, dtype=np.int64)
+        self.last_close = np.full(n, np.nan)
+
+        # Outputs of the latest bar per symbol
+        self.signal = np.zeros(n, dtype=np.int8)
+        self.pos_size = np.zeros(n)
+        self.last_pnl = np.zeros(n)
+        self.equity = np.zeros(n)
+
+        # Last applied date per symbol, and per-sector PnL of late bars not yet streamed
+        self.last_dates = np.full(n, np.datetime64('NaT'), dtype='datetime64[ns]')
+        self.late_pnl = np.zeros(len(self.sector_names))
+
+    # --- CONSTRUCTION ---
+
+    @classmethod
+    def from_panel(cls, panel: Panel, short_window: int = 20, long_window: int = 120,
+                   range_window: int = RANGE_WINDOW, capital: float = INITIAL_CAPITAL,
+                   num_assets: int = NUM_ASSETS) -> 'IncrementalEngine':
+        """Bootstraps state from one full panel pass over the available history."""
+        eng = cls(panel.symbols, panel.scale, panel.multiplier, panel.caps, panel.sector_codes,
+                  panel.sector_names, short_window, long_window, range_window, capital, num_assets)
+        if len(panel.dates) == 0:
+            return eng
+
+        ticks, valid = panel.ticks, panel.valid
+        signal = panel_signals(ticks, valid, short_window, long_window)
+        pos_size = panel_positions(ticks, valid, panel.scale, panel.multiplier, panel.caps,
+                                   eng.risk_per_asset, range_window)
+        pnl = panel_pnl(panel.close, signal, pos_size, panel.multiplier)
+        equity = np.cumsum(pnl, axis=0)
+
+        for j in range(len(eng.symbols)):
+            rows = np.flatnonzero(valid[:, j])
+            if rows.size == 0:
+                continue
+            col = ticks[rows, j]
+            moves = np.abs(np.diff(col))
+            count = rows.size
+            last = rows[-1]
+
+            eng.bars[j] = count
+            tail = np.arange(max(0, count - long_window), count)
+            eng.price_ring[tail % long_window, j] = col[tail]
+            mtail = np.arange(max(0, moves.size - range_window), moves.size)
+            eng.move_ring[mtail % range_window, j] = moves[mtail]
+            eng.short_sum[j] = col[-short_window:].sum()
+            eng.long_sum[j] = col[-long_window:].sum()
+            eng.range_sum[j] = moves[-range_window:].sum()
+            eng.last_tick[j] = col[-1]
+            eng.last_close[j] = panel.close[last, j]
+            eng.signal[j] = signal[last, j]
+            eng.pos_size[j] = pos_size[last, j]
+            eng.last_pnl[j] = pnl[last, j]
+            eng.equity[j] = equity[last, j]
+            eng.last_dates[j] = panel.dates[last]
+
+        eng.last_date = panel.dates[-1]
+        return eng
+
+    # --- DAILY UPDATE ---
+
+    def update(self, date, closes: Dict[str, float]) -> pd.DataFrame:
+        """
+        Applies one bar per listed symbol and returns the refreshed state of
+        those symbols (Signal, Pos_Size, Net_PnL, Equity).
+
+        Raises ValueError for a symbol whose state already holds a bar on or
+        after `date`.
+        """
+        unknown = [sym for sym in closes if sym not in self._index]
+        if unknown:
+            raise KeyError(f"Symbols not in the state universe: {', '.join(unknown)}; rebuild the state")
+        idx = np.array([self._index[sym] for sym in closes], dtype=np.intp)
+        stamp = np.datetime64(pd.Timestamp(date), 'ns')
+        stale = [self.symbols[i] for i in idx if self.last_dates[i] >= stamp]
+        if stale:
+            raise ValueError(f"Bars dated {pd.Timestamp(date).date()} are not newer than the state of: "
+                             f"{', '.join(stale)}")
+        close = np.array([closes[sym] for sym in closes], dtype=np.float64)
+        tick = np.rint(close * self.scale[idx]).astype(np.int64)
+        S, L, W = self.short_window, self.long_window, self.range_window
+
+        prev_bars = self.bars[idx]
+        bars = prev_bars + 1
+        has_prev = prev_bars > 0
+
+        # SMA window sums: the long window's leaving price sits in the slot being overwritten
+        slot = prev_bars % L
+        leaving_long = np.where(prev_bars >= L, self.price_ring[slot, idx], 0)
+        leaving_short = np.where(prev_bars >= S, self.price_ring[(prev_bars - S) % L, idx], 0)
+        self.price_ring[slot, idx] = tick
+        self.short_sum[idx] += tick - leaving_short
+        self.long_sum[idx] += tick - leaving_long
+
+        # Rolling absolute move window for Daily_Range
+        move = np.abs(tick - self.last_tick[idx])
+        moves_before = np.maximum(prev_bars - 1, 0)
+        mslot = moves_before % W
+        leaving_move = np.where(moves_before >= W, self.move_ring[mslot, idx], 0)
+        self.move_ring[mslot, idx] = np.where(has_prev, move, self.move_ring[mslot, idx])
+        self.range_sum[idx] += np.where(has_prev, move - leaving_move, 0)
+
+        # Signal with MaxBarsBack burn-in
+        above = L * self.short_sum[idx] > S * self.long_sum[idx]
+        signal = np.where(bars > L, np.where(above, 1, -1), 0).astype(np.int8)
+
+        # Volatility-adjusted, sector-capped size
+        daily_range = self.range_sum[idx] / (W * self.scale[idx])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pos = self.risk_per_asset / (daily_range * self.multiplier[idx])
+        pos = np.where((bars - 1 >= W) & (daily_range > 0), pos, 0.0)
+        pos = np.round(np.clip(pos, 0, self.caps[idx]))
+
+        # PnL on the prior bar's signal
+        pnl = (close - self.last_close[idx]) * self.multiplier[idx] * pos
+        pnl *= self.signal[idx]
+        pnl = np.where(has_prev, pnl, 0.0)
+
+        self.bars[idx] = bars
+        self.last_tick[idx] = tick
+        self.last_close[idx] = close
+        self.signal[idx] = signal
+        self.pos_size[idx] = pos
+        self.last_pnl[idx] = pnl
+        self.equity[idx] += pnl
+        self.last_dates[idx] = stamp
+        self.last_date = pd.Timestamp(date) if self.last_date is None else max(self.last_date, pd.Timestamp(date))
+
+        return self.snapshot(idx)
+
+    def pending_rows(self, dates: pd.DatetimeIndex, close: np.ndarray) -> np.ndarray:
+        """Mask of (dates x symbols) bars dated after each symbol's last applied bar."""
+        known = ~np.isnat(self.last_dates)
+        newer = dates.to_numpy()[:, None] > self.last_dates
+        return ~np.isnan(close) & (newer | ~known)
+
+    def update_panel(self, dates: pd.DatetimeIndex, close: np.ndarray) -> pd.DataFrame:
+        """
+        Applies a (dates x symbols) block of new bars, skipping NaN entries,
+        and returns the daily PnL per sector of the applied dates.
+        """
+        sector_pnl = np.zeros((len(dates), len(self.sector_names)))
+        for row, date in enumerate(dates):
+            present = np.flatnonzero(~np.isnan(close[row]))
+            if present.size:
+                self.update(date, {self.symbols[j]: close[row, j] for j in present})
+                sector_pnl[row] = np.bincount(self.sector_codes[present], weights=self.last_pnl[present],
+                                              minlength=len(self.sector_names))
+        return pd.DataFrame(sector_pnl, index=dates, columns=self.sector_names)
+
+    # --- RESULTS ---
+
+    def snapshot(self, idx: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Current Signal, Pos_Size, latest Net_PnL and cumulative Equity per symbol."""
+        idx = np.arange(len(self.symbols)) if idx is None else idx
+        return pd.DataFrame({'Signal': self.signal[idx], 'Pos_Size': self.pos_size[idx],
+                             'Net_PnL': self.last_pnl[idx], 'Equity': self.equity[idx]},
+                            index=pd.Index([self.symbols[i] for i in idx], name='Symbol'))
+
+    def sector_equity(self) -> pd.Series:
+        """Cumulative PnL per sector plus the portfolio account value."""
+        totals = np.bincount(self.sector_codes, weights=self.equity, minlength=len(self.sector_names))
+        out = pd.Series(totals, index=self.sector_names)
+        out['TOTAL PORTFOLIO'] = self.capital + self.equity.sum()
+        return out
+
+    # --- PERSISTENCE ---
+
+    def save(self, path: Path) -> None:
+        """Persists the rolling state as <path>/state.npz plus state.json."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.savez(path / 'state.npz', **{name: getattr(self, name) for name in self._ARRAYS})
+        meta = {'symbols': self.symbols, 'sector_names': self.sector_names,
+                'short_window': self.short_window, 'long_window': self.long_window,
+                'range_window': self.range_window, 'capital': self.capital, 'num_assets': self.num_assets,
+                'last_date': None if self.last_date is None else self.last_date.strftime('%Y-%m-%d')}
+        with open(path / 'state.json', 'w') as fh:
+            json.dump(meta, fh, indent=1)
+
+    @classmethod
+    def load(cls, path: Path) -> 'IncrementalEngine':
+        path = Path(path)
+        with open(path / 'state.json') as fh:
+            meta = json.load(fh)
+        arrays = np.load(path / 'state.npz')
+        eng = cls(meta['symbols'], arrays['scale'], arrays['multiplier'], arrays['caps'],
+                  arrays['sector_codes'], meta['sector_names'], meta['short_window'],
+                  meta['long_window'], meta['range_window'], meta['capital'], meta['num_assets'])
+        for name in cls._ARRAYS:
+            setattr(eng, name, arrays[name].copy())
+        eng.last_date = pd.Timestamp(meta['last_date']) if meta['last_date'] else None
+        return eng
+
+
+def _metric_curves(sector_daily: pd.DataFrame) -> np.ndarray:
+    """(curves x days) PnL of every sector followed by the total portfolio."""
+    return np.vstack([sector_daily.to_numpy().T, sector_daily.sum(axis=1).to_numpy()])
+
+
+def run_daily_update(state_path: Optional[Path] = None, data_folder: Optional[Path] = None,
+                     rebuild: bool = False) -> Optional[pd.Series]:
+    """
+    End-of-day job: loads the persisted state (bootstrapping it from the
+    full history on first run or with `rebuild`), applies every stored bar
+    dated after that symbol's last applied bar, extends the running
+    sector/portfolio statistics (<state_path>/metrics), saves both and
+    returns sector equity.
+
+    Raises ValueError when the store's universe differs from the state's;
+    the streamed statistics cannot absorb a market's past, so the state
+    has to be rebuilt from the full history.
+    """
+    data_folder = Path(data_folder) if data_folder is not None else default_data_folder()
+    state_path = Path(state_path) if state_path is not None else data_folder / 'state'
+
+    panel = build_panel(data_folder=data_folder)
+    if panel is None:
+        return None
+
+    metrics_path = state_path / 'metrics'
+    if not rebuild and (state_path / 'state.json').exists() and (metrics_path / 'metrics.json').exists():
+        eng = IncrementalEngine.load(state_path)
+        added = sorted(set(panel.symbols) - set(eng.symbols))
+        removed = sorted(set(eng.symbols) - set(panel.symbols))
+        if added or removed:
+            raise ValueError(f"Market universe changed since the state in {state_path} was built "
+                             f"(added: {', '.join(added) or 'none'}; removed: {', '.join(removed) or 'none'}); "
+                             f"rebuild it with run_daily_update(rebuild=True) or `python incremental.py --rebuild`")
+        metrics = StreamingMetrics.load(metrics_path)
+        close = panel.close[:, [panel.symbols.index(sym) for sym in eng.symbols]]
+        pending = eng.pending_rows(panel.dates, close)
+        rows = pending.any(axis=1)
+        mark = eng.last_date
+        sector_daily = eng.update_panel(panel.dates[rows], np.where(pending, close, np.nan)[rows])
+
+        # Late bars restate days the statistics already absorbed: book them on the next new day
+        late = sector_daily.index <= mark if mark is not None else np.zeros(len(sector_daily), dtype=bool)
+        eng.late_pnl += sector_daily[late].to_numpy().sum(axis=0)
+        sector_daily = sector_daily[~late]
+        if len(sector_daily):
+            sector_daily.iloc[0] += eng.late_pnl
+            eng.late_pnl[:] = 0.0
+    else:
+        eng = IncrementalEngine.from_panel(panel)
+        metrics = StreamingMetrics(len(eng.sector_names) + 1, eng.capital,
+                                   names=eng.sector_names + ['TOTAL PORTFOLIO'])
+        sector_daily = run_panel_backtest(panel, eng.short_window, eng.long_window, eng.capital,
+                                          eng.num_assets, eng.range_window)
+    metrics.update_many(_metric_curves(sector_daily))
+
+    eng.save(state_path)
+    metrics.save(metrics_path)
+    return eng.sector_equity()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="End-of-day incremental update of the persisted state")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="re-bootstrap the state and statistics from the full history (after a universe change)")
+    args = parser.parse_args()
+
+    print(run_daily_update(rebuild=args.rebuild))
+    state = StreamingMetrics.load(default_data_folder() / 'state' / 'metrics')
+    pd.set_option('display.width', 160)
+    print("\nFull history\n", state.stats().round(3), "\n\nTrailing year\n", state.rolling().round(3), sep='')
@@ -0,0 +1,370 @@
+"""
+Checkpointed Job Runner
+-----------------------
+Splits long runs into shards, dispatches them to worker processes through
+a file queue and merges the checkpointed shard results deterministically.
+
+A job is a folder:
+
+    job.json            kind, parameters and shard count
+    pending/NNNNN.json  shard specs waiting for a worker
+    claimed/NNNNN.json  shards being worked on
+    failed/NNNNN.json   shards that raised (NNNNN.err holds the traceback)
+    results/NNNNN.npz   finished shards (the checkpoints)
+
+Workers claim a shard by renaming it from pending/ to claimed/; the
+rename is atomic, so any number of workers, local or on other nodes
+sharing the folder (`python jobs.py work JOB`), can pull from the same
+queue. Results are written to a temporary file and moved into place, so
+a crash never leaves a partial checkpoint. Re-running a job requeues
+claimed and failed shards and only computes what has no result yet.
+
+Kinds:
+    symbols  serial per-market engine, sharded by symbol blocks
+    sweep    SMA window grid (panel engine), sharded by long-window blocks
+    stress   Monte Carlo stress test, sharded by path batches with
+             independent child seeds
+"""
+
+import json
+import os
+import tempfile
+import time
+import traceback
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from engine import INITIAL_CAPITAL, TARGET_DAILY_VOL, NUM_ASSETS, RANGE_WINDOW, get_sector
+from store import default_data_folder, load_store
+
+_QUEUES = ('pending', 'claimed', 'failed', 'results')
+
+
+def default_jobs_folder() -> Path:
+    return default_data_folder() / 'jobs'
+
+
+def _shard_name(index: int) -> str:
+    return f"{index:05d}"
+
+
+def _write_atomic(path: Path, write: Callable) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            write(fh)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+# --- SHARD KINDS ---
+
+def _symbols_shard(params: Dict, spec: Dict) -> Dict[str, np.ndarray]:
+    from backtest import backtest_symbol
+
+    store = load_store(Path(params['data_folder']))
+    risk_per_asset = params['capital'] * TARGET_DAILY_VOL / np.sqrt(params['num_assets'])
+    out = {}
+    for symbol in spec['symbols']:
+        pnl = backtest_symbol(symbol, store.frame(symbol), risk_per_asset)
+        out[f"{symbol}/dates"] = pnl.index.values.astype('datetime64[ns]').view(np.int64)
+        out[f"{symbol}/pnl"] = pnl.to_numpy()
+    return out
+
+
+def _symbols_merge(params: Dict, shards: List[Dict[str, np.ndarray]]) -> Optional[pd.DataFrame]:
+    from backtest import aggregate_sector_pnls
+
+    sector_pnls = {}
+    for result in shards:
+        for key in sorted(k for k in result if k.endswith('/pnl')):
+            symbol = key[:-len('/pnl')]
+            dates = pd.DatetimeIndex(result[f"{symbol}/dates"].view('datetime64[ns]'), name='Date')
+            sector_pnls.setdefault(get_sector(symbol), []).append(
+                (params['symbols'].index(symbol), pd.Series(result[key], index=dates, name=symbol)))
+    # Serial symbol order within each sector, whatever order the shards finished in
+    return aggregate_sector_pnls({sector: [s for _, s in sorted(series, key=lambda x: x[0])]
+                                  for sector, series in sector_pnls.items()})
+
+
+def _sweep_shard(params: Dict, spec: Dict) -> Dict[str, np.ndarray]:
+    from panel import build_panel, run_panel_sweep
+
+    panel = build_panel(data_folder=Path(params['data_folder']))
+    result = run_panel_sweep(panel, params['short_windows'], spec['long_windows'], params['capital'],
+                             params['num_assets'], params['range_window'])
+    return {'pairs': np.array(result.pairs, dtype=np.int64).reshape(-1, 2), 'pnl': result.pnl,
+            'dates': result.dates.values.astype('datetime64[ns]').view(np.int64)}
+
+
+def _sweep_merge(params: Dict, shards: List[Dict[str, np.ndarray]]) -> pd.DataFrame:
+    """Daily portfolio PnL per (short_window, long_window), columns in sorted pair order."""
+    pairs = np.concatenate([r['pairs'] for r in shards])
+    pnl = np.concatenate([r['pnl'] for r in shards])
+    order = np.lexsort((pairs[:, 1], pairs[:, 0]))
+    columns = pd.MultiIndex.from_arrays([pairs[order, 0], pairs[order, 1]], names=['short_window', 'long_window'])
+    dates = pd.DatetimeIndex(shards[0]['dates'].view('datetime64[ns]'), name='Date')
+    return pd.DataFrame(pnl[order].T, index=dates, columns=columns)
+
+
+def _stress_shard(params: Dict, spec: Dict) -> Dict[str, np.ndarray]:
+    from stress import run_stress_test
+
+    result = run_stress_test(params['source'], spec['num_paths'], params['batch_size'], spec['seed'],
+                             params['block_length'], capital=params['capital'])
+    return {name: result.metrics[name].to_numpy() for name in result.metrics.columns}
+
+
+def _stress_merge(params: Dict, shards: List[Dict[str, np.ndarray]]) -> pd.DataFrame:
+    table = pd.concat([pd.DataFrame(r) for r in shards], ignore_index=True)
+    table.index.name = 'path'
+    return table
+
+
+KINDS: Dict[str, Dict[str, Callable]] = {
+    'symbols': {'run': _symbols_shard, 'merge': _symbols_merge},
+    'sweep': {'run': _sweep_shard, 'merge': _sweep_merge},
+    'stress': {'run': _stress_shard, 'merge': _stress_merge},
+}
+
+
+# --- JOB CREATION ---
+
+def create_job(job_dir: Path, kind: str, params: Dict, shards: Sequence[Dict]) -> Path:
+    """Writes job.json and one pending spec per shard; fails if the folder already holds a job."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job_dir = Path(job_dir)
+    if (job_dir / 'job.json').exists():
+        raise FileExistsError(f"{job_dir} already holds a job; run it to resume")
+    for queue in _QUEUES:
+        (job_dir / queue).mkdir(parents=True, exist_ok=True)
+    for index, spec in enumerate(shards):
+        with open(job_dir / 'pending' / f"{_shard_name(index)}.json", 'w') as fh:
+            json.dump(spec, fh)
+    # job.json last: a folder without it is an incomplete submission
+    with open(job_dir / 'job.json', 'w') as fh:
+        json.dump({'kind': kind, 'params': params, 'num_shards': len(shards), 'created': time.time()}, fh, indent=1)
+    return job_dir
+
+
+def symbols_job(job_dir: Path, shard_size: int = 8, data_folder: Optional[Path] = None,
+                capital: float = INITIAL_CAPITAL, num_assets: int = NUM_ASSETS) -> Path:
+    data_folder = Path(data_folder) if data_folder is not None else default_data_folder()
+    store = load_store(data_folder)
+    if store is None:
+        raise FileNotFoundError("No market data found; run generator.py first")
+    symbols = [s for s in store.symbols if get_sector(s)]
+    shards = [{'symbols': symbols[i:i + shard_size]} for i in range(0, len(symbols), shard_size)]
+    params = {'data_folder': str(data_folder), 'symbols': symbols, 'capital': capital, 'num_assets': num_assets}
+    return create_job(job_dir, 'symbols', params, shards)
+
+
+def sweep_job(job_dir: Path, short_windows: Sequence[int], long_windows: Sequence[int],
+              longs_per_shard: int = 2, range_window: int = RANGE_WINDOW, data_folder: Optional[Path] = None,
+              capital: float = INITIAL_CAPITAL, num_assets: int = NUM_ASSETS) -> Path:
+    data_folder = Path(data_folder) if data_folder is not None else default_data_folder()
+    longs = sorted(set(long_windows))
+    shards = [{'long_windows': longs[i:i + longs_per_shard]} for i in range(0, len(longs), longs_per_shard)]
+    params = {'data_folder': str(data_folder), 'short_windows': sorted(set(short_windows)),
+              'range_window': range_window, 'capital': capital, 'num_assets': num_assets}
+    return create_job(job_dir, 'sweep', params, shards)
+
+
+def stress_job(job_dir: Path, num_paths: int, paths_per_shard: int = 64, source: str = 'simulate',
+               seed: Optional[int] = None, batch_size: int = 16, block_length: int = 20,
+               capital: float = INITIAL_CAPITAL) -> Path:
+    # The root seed is fixed at submission so a resumed job draws the same paths
+    seed = int(np.random.SeedSequence(seed).generate_state(1)[0]) if seed is None else seed
+    counts = [min(paths_per_shard, num_paths - p0) for p0 in range(0, num_paths, paths_per_shard)]
+    children = np.random.SeedSequence(seed).spawn(len(counts))
+    shards = [{'num_paths': n, 'seed': int(child.generate_state(1)[0])} for n, child in zip(counts, children)]
+    params = {'source': source, 'seed': seed, 'batch_size': batch_size, 'block_length': block_length,
+              'capital': capital}
+    return create_job(job_dir, 'stress', params, shards)
+
+
+# --- QUEUE ---
+
+def load_job(job_dir: Path) -> Dict:
+    with open(Path(job_dir) / 'job.json') as fh:
+        return json.load(fh)
+
+
+def status(job_dir: Path) -> Dict[str, int]:
+    """Shard counts per queue folder."""
+    job_dir = Path(job_dir)
+    counts = {q: len(list((job_dir / q).glob('*.json'))) for q in ('pending', 'claimed', 'failed')}
+    counts['done'] = len(list((job_dir / 'results').glob('*.npz')))
+    counts['total'] = load_job(job_dir)['num_shards']
+    return counts
+
+
+def requeue(job_dir: Path, lease_seconds: Optional[float] = None) -> int:
+    """
+    Returns claimed shards without a result (older than `lease_seconds`,
+    or all when None) and failed shards to the pending queue.
+    """
+    job_dir = Path(job_dir)
+    moved = 0
+    now = time.time()
+    for folder in ('claimed', 'failed'):
+        for spec in sorted((job_dir / folder).glob('*.json')):
+            if folder == 'claimed' and lease_seconds is not None:
+                try:
+                    if now - spec.stat().st_mtime < lease_seconds:
+                        continue
+                except FileNotFoundError:
+                    continue
+            if (job_dir / 'results' / f"{spec.stem}.npz").exists():
+                spec.unlink(missing_ok=True)
+                continue
+            try:
+                os.replace(spec, job_dir / 'pending' / spec.name)
+                moved += 1
+            except FileNotFoundError:
+                pass
+            (job_dir / folder / f"{spec.stem}.err").unlink(missing_ok=True)
+    return moved
+
+
+def _claim(job_dir: Path) -> Optional[Path]:
+    for spec in sorted((job_dir / 'pending').glob('*.json')):
+        target = job_dir / 'claimed' / spec.name
+        try:
+            os.rename(spec, target)
+        except FileNotFoundError:
+            continue          # another worker won the race
+        os.utime(target)      # claim time for lease-based requeue
+        return target
+    return None
+
+
+def work(job_dir: Path, max_shards: Optional[int] = None) -> int:
+    """Worker loop: claims, runs and checkpoints shards until the queue is empty; returns shards done."""
+    job_dir = Path(job_dir)
+    job = load_job(job_dir)
+    run = KINDS[job['kind']]['run']
+    done = 0
+    while max_shards is None or done < max_shards:
+        claimed = _claim(job_dir)
+        if claimed is None:
+            break
+        with open(claimed) as fh:
+            spec = json.load(fh)
+        try:
+            result = run(job['params'], spec)
+        except Exception:
+            os.replace(claimed, job_dir / 'failed' / claimed.name)
+            (job_dir / 'failed' / f"{claimed.stem}.err").write_text(traceback.format_exc())
+            continue
+        _write_atomic(job_dir / 'results' / f"{claimed.stem}.npz", lambda fh: np.savez(fh, **result))
+        claimed.unlink(missing_ok=True)
+        done += 1
+    return done
+
+
+# --- DRIVER ---
+
+def run_job(job_dir: Path, workers: Optional[int] = None, lease_seconds: Optional[float] = None):
+    """
+    Runs (or resumes) a job with a pool of local worker processes and
+    returns the merged result once every shard has a checkpoint.
+
+    Without `lease_seconds` every claimed shard is assumed orphaned by an
+    earlier crash and requeued; pass a lease when other nodes may still be
+    working on the same job.
+    """
+    from multiprocessing import get_context
+
+    job_dir = Path(job_dir)
+    requeue(job_dir, lease_seconds)
+    pending = status(job_dir)['pending']
+    workers = max(1, min(workers or os.cpu_count() or 1, pending)) if pending else 0
+
+    ctx = get_context('spawn')
+    procs = [ctx.Process(target=work, args=(job_dir,)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    counts = status(job_dir)
+    if counts['done'] < counts['total']:
+        errors = sorted((job_dir / 'failed').glob('*.err'))
+        detail = errors[0].read_text().strip().splitlines()[-1] if errors else 'shards still claimed'
+        raise RuntimeError(f"{counts['total'] - counts['done']} of {counts['total']} shards unfinished "
+                           f"({counts['failed']} failed: {detail}); run the job again to retry")
+    return merge_job(job_dir)
+
+
+def merge_job(job_dir: Path):
+    """Combines the shard checkpoints in shard order; independent of which worker ran what, or when."""
+    job_dir = Path(job_dir)
+    job = load_job(job_dir)
+    shards = []
+    for index in range(job['num_shards']):
+        with np.load(job_dir / 'results' / f"{_shard_name(index)}.npz") as data:
+            shards.append({name: data[name] for name in data.files})
+    return KINDS[job['kind']]['merge'](job['params'], shards)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Checkpointed, sharded job runner")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    submit = sub.add_parser('submit', help="create a job folder")
+    submit.add_argument('kind', choices=sorted(KINDS))
+    submit.add_argument('job', type=Path)
+    submit.add_argument('--shard-size', type=int, default=None,
+                        help="symbols, long windows or paths per shard")
+    submit.add_argument('--shorts', type=int, nargs='+', default=[10, 20, 30, 40, 50])
+    submit.add_argument('--longs', type=int, nargs='+', default=[60, 80, 100, 120, 160, 200, 250])
+    submit.add_argument('--paths', type=int, default=1000)
+    submit.add_argument('--source', choices=['simulate', 'store', 'bootstrap'], default='simulate')
+    submit.add_argument('--seed', type=int, default=None)
+
+    for name, text in (('run', "run or resume a job with local workers, then merge"),
+                       ('work', "join a job as a single worker (e.g. from another node)"),
+                       ('status', "show shard counts")):
+        cmd = sub.add_parser(name, help=text)
+        cmd.add_argument('job', type=Path)
+        if name == 'run':
+            cmd.add_argument('--workers', type=int, default=None)
+            cmd.add_argument('--lease', type=float, default=None,
+                             help="only requeue claims older than this many seconds")
+    args = parser.parse_args()
+
+    if args.command == 'submit':
+        if args.kind == 'symbols':
+            symbols_job(args.job, args.shard_size or 8)
+        elif args.kind == 'sweep':
+            sweep_job(args.job, args.shorts, args.longs, args.shard_size or 2)
+        else:
+            stress_job(args.job, args.paths, args.shard_size or 64, args.source, args.seed)
+        print(f"{load_job(args.job)['num_shards']} shards queued in {args.job}")
+    elif args.command == 'work':
+        print(f"{work(args.job)} shards completed")
+    elif args.command == 'status':
+        print(status(args.job))
+    else:
+        start = time.perf_counter()
+        merged = run_job(args.job, args.workers, args.lease)
+        kind = load_job(args.job)['kind']
+        pd.set_option('display.width', 160)
+        if kind == 'symbols':
+            print(merged.sum().round(2).to_string())
+        elif kind == 'sweep':
+            from metrics import summarize
+            table = summarize(merged.to_numpy().T, INITIAL_CAPITAL)
+            table.index = merged.columns
+            print(table.sort_values('sharpe', ascending=False).head(10).round(3))
+        else:
+            print(merged.describe().T.drop(columns='count').round(3))
+        print(f"\nmerged in {time.perf_counter() - start:.2f}s -> {args.job}")
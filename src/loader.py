@@ -0,0 +1,202 @@
+"""
+Prefetching Symbol Loader
+-------------------------
+Overlaps market data I/O with per-symbol compute. A bounded pool of
+reader threads loads and parses upcoming symbols (a CSV parse or a copy
+out of the memory-mapped store, both of which release the GIL for most
+of their work) while the caller is still processing the current one, so
+a serial pass costs about max(I/O, compute) instead of their sum.
+Symbols are always yielded in the same order as the store (or the
+sorted CSV file names), whatever order the reads finish in, and at most
+`depth` frames exist at once: the one being processed plus depth - 1
+read ahead.
+
+Contract metadata for the whole universe is resolved once, as aligned
+arrays, by symbol_specs(); the loader exposes it for the symbols it
+yields and panel.make_panel() builds its columns from the same table.
+
+    loader = SymbolLoader(traded_only=True)
+    for (symbol, df), sector in zip(loader, loader.specs.sectors):
+        ...
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+import pandas as pd
+
+from engine import SECTORS, get_sector, get_sector_cap, get_contract_terms, root_symbol
+from profiling import stage
+from store import MarketStore, open_store, default_data_folder
+
+DEFAULT_DEPTH = 4
+DEFAULT_WORKERS = 2
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+@dataclass
+class SymbolSpecs:
+    """Sector and contract terms of a symbol list, one aligned entry per symbol."""
+    symbols: List[str]
+    sectors: List[Optional[str]]   # None for markets outside SECTORS
+    tick_size: np.ndarray          # float64
+    tick_value: np.ndarray         # float64 dollars per tick
+    multiplier: np.ndarray         # dollars per 1.0 price move (tick_value / tick_size)
+    caps: np.ndarray               # float64 sector exposure cap (0 for untraded markets)
+    sector_codes: np.ndarray       # index into sector_names, -1 for untraded markets
+    sector_names: List[str]        # sectors present, in SECTORS order
+
+    @property
+    def traded(self) -> np.ndarray:
+        return self.sector_codes >= 0
+
+
+def symbol_specs(symbols: Sequence[str]) -> SymbolSpecs:
+    """
+    Resolves sectors, contract terms and caps for a whole universe at once.
+    Lookups run once per distinct root market and are broadcast to every
+    clone ('ES', 'ES.1', 'ES.2', ... share one lookup).
+    """
+    symbols = list(symbols)
+    roots, inverse = np.unique(np.array([root_symbol(s) for s in symbols], dtype=object), return_inverse=True)
+    root_sectors = [get_sector(r) for r in roots]
+    root_terms = np.array([get_contract_terms(r) for r in roots], dtype=np.float64).reshape(-1, 2)
+    root_caps = np.array([get_sector_cap(s) if s else 0 for s in root_sectors], dtype=np.float64)
+
+    sector_names = [s for s in SECTORS if s in root_sectors]
+    root_codes = np.array([sector_names.index(s) if s else -1 for s in root_sectors], dtype=np.intp)
+
+    tick_size, tick_value = root_terms[inverse, 0], root_terms[inverse, 1]
+    return SymbolSpecs(symbols=symbols, sectors=[root_sectors[i] for i in inverse], tick_size=tick_size,
+                       tick_value=tick_value, multiplier=tick_value / tick_size, caps=root_caps[inverse],
+                       sector_codes=root_codes[inverse], sector_names=sector_names)
+
+
+def prefetch(items: Iterable[T], load: Callable[[T], R], depth: int = DEFAULT_DEPTH,
+             workers: int = DEFAULT_WORKERS) -> Iterator[Tuple[T, R]]:
+    """
+    Yields (item, load(item)) in input order, loading on `workers` threads.
+    At most `depth` results exist at once: the one yielded plus depth - 1
+    upcoming items in flight (depth <= 1 loads serially). Exceptions from
+    load() are raised when their item is reached; closing the generator
+    early cancels the outstanding reads.
+    """
+    if depth <= 1 or workers < 1:
+        for item in items:
+            yield item, load(item)
+        return
+
+    pending = deque()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+    try:
+        for item in items:
+            # Hand over the oldest result before starting another read, keeping the bound
+            if len(pending) == depth:
+                head, future = pending.popleft()
+                yield head, future.result()
+            pending.append((item, pool.submit(load, item)))
+        while pending:
+            head, future = pending.popleft()
+            yield head, future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class SymbolLoader:
+    """
+    Ordered, prefetching iterator of (symbol, DataFrame) over the data
+    folder: the binary store when present, legacy per-symbol CSV files
+    otherwise. Frames have the legacy CSV layout (Date, Open, High, Low, Close).
+
+    Args:
+        excluded: Symbols to skip.
+        traded_only: Skip markets without a sector (they carry no PnL).
+        depth: Frames held at once, the consumer's included (<= 1 = serial reads).
+        workers: Reader threads.
+    """
+
+    def __init__(self, data_folder: Optional[Path] = None, excluded: Sequence[str] = (),
+                 traded_only: bool = False, depth: int = DEFAULT_DEPTH, workers: int = DEFAULT_WORKERS):
+        self.data_folder = Path(data_folder) if data_folder is not None else default_data_folder()
+        self.depth, self.workers = depth, workers
+        self.store: Optional[MarketStore] = open_store(self.data_folder / 'market')
+
+        if self.store is not None:
+            universe = list(self.store.symbols)
+        elif self.data_folder.exists():
+            universe = sorted(f[:-4] for f in os.listdir(self.data_folder) if f.endswith('.csv'))
+        else:
+            universe = []
+        universe = [s for s in universe if s not in excluded]
+
+        specs = symbol_specs(universe)
+        if traded_only and not specs.traded.all():
+            specs = symbol_specs([s for s, ok in zip(universe, specs.traded) if ok])
+        self.specs = specs
+
+    @property
+    def symbols(self) -> List[str]:
+        return self.specs.symbols
+
+    def __len__(self) -> int:
+        return len(self.specs.symbols)
+
+    def read(self, symbol: str) -> pd.DataFrame:
+        """Loads one symbol on the calling thread."""
+        with stage('load', symbol=symbol):
+            if self.store is not None:
+                return self.store.frame(symbol)
+            return pd.read_csv(self.data_folder / f"{symbol}.csv", parse_dates=['Date'])
+
+    def __iter__(self) -> Iterator[Tuple[str, pd.DataFrame]]:
+        return prefetch(self.symbols, self.read, self.depth, self.workers)
+
+
+# --- OVERLAP BENCHMARK ---
+
+def benchmark(data_folder: Optional[Path] = None, depth: int = DEFAULT_DEPTH,
+              workers: int = DEFAULT_WORKERS) -> pd.DataFrame:
+    """
+    Wall time of the serial backtest's load + compute loop with serial reads
+    (split into I/O and compute) and with prefetching.
+    """
+    import time
+    from backtest import backtest_symbol
+    from engine import INITIAL_CAPITAL, TARGET_DAILY_VOL, NUM_ASSETS
+
+    risk_per_asset = INITIAL_CAPITAL * TARGET_DAILY_VOL / np.sqrt(NUM_ASSETS)
+    loader = SymbolLoader(data_folder, traded_only=True, depth=depth, workers=workers)
+
+    io = compute = 0.0
+    for symbol in loader.symbols:
+        t0 = time.perf_counter()
+        df = loader.read(symbol)
+        t1 = time.perf_counter()
+        backtest_symbol(symbol, df, risk_per_asset)
+        io, compute = io + t1 - t0, compute + time.perf_counter() - t1
+
+    start = time.perf_counter()
+    for symbol, df in loader:
+        backtest_symbol(symbol, df, risk_per_asset)
+    overlapped = time.perf_counter() - start
+
+    return pd.DataFrame({'seconds': [io + compute, overlapped], 'io_seconds': [io, np.nan],
+                         'compute_seconds': [compute, np.nan], 'symbols': len(loader)},
+                        index=pd.Index(['serial', f'prefetch (depth {depth}, {workers} threads)'], name='mode'))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serial vs prefetched symbol loading")
+    parser.add_argument('--data', type=Path, default=None, help="data folder (default data/)")
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help="frames loaded ahead")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="reader threads")
+    args = parser.parse_args()
+    print(benchmark(args.data, args.depth, args.workers).round(3))
@@ -0,0 +1,298 @@
+"""
+Performance Metrics
+-------------------
+Vectorized risk/return statistics over daily PnL. Every function reduces
+along the last axis, so a single curve, a (paths x dates) batch or a
+(params x dates) sweep are all evaluated in one call.
+
+curve_stats() computes the full set (annualized return, Sharpe, Sortino,
+max drawdown and its duration, Calmar) from one set of shared running
+sums, and rolling_stats() gives the same figures over every trailing
+1-year window. StreamingMetrics carries those running sums between calls
+so the daily-update job extends its statistics one day at a time.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+TRADING_DAYS = 252
+STAT_COLUMNS = ('ann_return', 'sharpe', 'sortino', 'max_drawdown', 'max_dd_days', 'calmar')
+
+# Elements per block of the (curves x windows x window) drawdown view; small blocks stay in cache
+_WINDOW_BLOCK = 2 ** 16
+
+
+def annualized_return(daily_pnl: np.ndarray, capital: float) -> np.ndarray:
+    """Compound annual growth of the account in percent (final ratio floored at 1%)."""
+    daily_pnl = np.asarray(daily_pnl)
+    final_ratio = (capital + daily_pnl.sum(axis=-1)) / capital
+    return (np.power(np.maximum(0.01, final_ratio), TRADING_DAYS / daily_pnl.shape[-1]) - 1) * 100
+
+
+def sharpe_ratio(daily_pnl: np.ndarray, capital: float) -> np.ndarray:
+    """Annualized Sharpe ratio of daily returns on capital (0 for flat curves)."""
+    daily_rets = np.asarray(daily_pnl) / capital
+    std = daily_rets.std(axis=-1, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = daily_rets.mean(axis=-1) / std * np.sqrt(TRADING_DAYS)
+    return np.where(std > 0, sharpe, 0.0)
+
+
+def sortino_ratio(daily_pnl: np.ndarray, capital: float) -> np.ndarray:
+    """Annualized mean return over downside deviation (0 when there are no losing days)."""
+    daily_rets = np.asarray(daily_pnl) / capital
+    losing = daily_rets < 0
+    n_down = losing.sum(axis=-1)
+    downside = np.where(losing, daily_rets, 0.0)
+    down_mean = downside.sum(axis=-1) / np.maximum(n_down, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        down_var = (np.where(losing, downside - down_mean[..., None], 0.0) ** 2).sum(axis=-1) / (n_down - 1)
+        sortino = daily_rets.mean(axis=-1) / np.sqrt(down_var) * np.sqrt(TRADING_DAYS)
+    return np.where(n_down > 0, sortino, 0.0)
+
+
+def max_drawdown(daily_pnl: np.ndarray, capital: float) -> np.ndarray:
+    """Largest peak-to-trough decline of the account value, as a negative fraction."""
+    equity = capital + np.cumsum(daily_pnl, axis=-1)
+    peak = np.maximum.accumulate(np.maximum(equity, capital), axis=-1)
+    return (equity / peak - 1).min(axis=-1)
+
+
+def max_drawdown_duration(daily_pnl: np.ndarray, capital: float) -> np.ndarray:
+    """Longest run of days spent below the prior account high."""
+    return curve_stats(daily_pnl, capital)['max_dd_days']
+
+
+def curve_stats(daily_pnl: np.ndarray, capital: float) -> Dict[str, np.ndarray]:
+    """
+    Every statistic of STAT_COLUMNS per curve, sharing the return moments
+    and the equity/peak path between them.
+    """
+    return StreamingMetrics(np.shape(np.atleast_2d(daily_pnl))[0], capital).update_many(daily_pnl).arrays()
+
+
+def summarize(daily_pnl: np.ndarray, capital: float) -> pd.DataFrame:
+    """Per-curve table of annualized return, Sharpe, Sortino, drawdown depth/duration and Calmar."""
+    return pd.DataFrame(curve_stats(daily_pnl, capital), columns=list(STAT_COLUMNS))
+
+
+def _calmar(ann_return: np.ndarray, drawdown: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(drawdown < 0, ann_return / 100 / -drawdown, 0.0)
+
+
+# --- ROLLING WINDOWS ---
+
+def _window_sums(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing sums along the last axis for every complete window."""
+    cs = np.cumsum(values, axis=-1)
+    out = cs[..., window - 1:].copy()
+    out[..., 1:] -= cs[..., :-window]
+    return out
+
+
+def _window_drawdowns(daily_pnl: np.ndarray, capital: float, window: int):
+    """Max drawdown and its duration inside every trailing window, each window starting at `capital`."""
+    num_curves, num_days = daily_pnl.shape
+    num_windows = num_days - window + 1
+    cs = np.zeros((num_curves, num_days + 1))
+    np.cumsum(daily_pnl, axis=-1, out=cs[:, 1:])
+    view = sliding_window_view(cs[:, 1:], window, axis=-1)
+    steps = np.arange(window)
+
+    depth = np.empty((num_curves, num_windows))
+    duration = np.empty((num_curves, num_windows), dtype=np.int64)
+    block = max(1, _WINDOW_BLOCK // max(1, num_curves * window))
+    for w0 in range(0, num_windows, block):
+        w1 = min(w0 + block, num_windows)
+        equity = capital + view[:, w0:w1] - cs[:, w0:w1, None]
+        peak = np.maximum(np.maximum.accumulate(equity, axis=-1), capital)
+        depth[:, w0:w1] = (equity / peak - 1).min(axis=-1)
+        last_high = np.maximum.accumulate(np.where(equity < peak, -1, steps), axis=-1)
+        duration[:, w0:w1] = (steps - last_high).max(axis=-1)
+    return depth, duration
+
+
+def rolling_stats(daily_pnl: np.ndarray, capital: float, window: int = TRADING_DAYS) -> Dict[str, np.ndarray]:
+    """
+    STAT_COLUMNS over every trailing `window`-day window, (curves x dates)
+    per statistic and NaN until the first window completes. Each value
+    equals curve_stats() applied to that window's PnL.
+    """
+    daily_pnl = np.atleast_2d(np.asarray(daily_pnl, dtype=np.float64))
+    num_curves, num_days = daily_pnl.shape
+    out = {name: np.full((num_curves, num_days), np.nan) for name in STAT_COLUMNS}
+    if num_days < window or window < 2:
+        return out
+    live = slice(window - 1, None)
+    rets = daily_pnl / capital
+
+    # Moments from windowed sums; centering on the full-sample mean keeps the variance well conditioned
+    total = _window_sums(rets, window)
+    centered = rets - rets.mean(axis=-1, keepdims=True)
+    c_sum = _window_sums(centered, window)
+    c_sq = _window_sums(centered ** 2, window)
+    losing = rets < 0
+    n_down = _window_sums(losing.astype(np.float64), window)
+    d_sum = _window_sums(np.where(losing, rets, 0.0), window)
+    d_sq = _window_sums(np.where(losing, rets ** 2, 0.0), window)
+
+    mean = total / window
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.sqrt(np.maximum(c_sq - c_sum ** 2 / window, 0) / (window - 1))
+        sharpe = np.where(std > 0, mean / std * np.sqrt(TRADING_DAYS), 0.0)
+        down_var = np.maximum(d_sq - d_sum ** 2 / np.maximum(n_down, 1), 0) / (n_down - 1)
+        sortino = np.where(n_down > 0, mean / np.sqrt(down_var) * np.sqrt(TRADING_DAYS), 0.0)
+
+    out['ann_return'][:, live] = (np.power(np.maximum(0.01, 1 + total), TRADING_DAYS / window) - 1) * 100
+    out['sharpe'][:, live] = sharpe
+    out['sortino'][:, live] = sortino
+    depth, duration = _window_drawdowns(daily_pnl, capital, window)
+    out['max_drawdown'][:, live] = depth
+    out['max_dd_days'][:, live] = duration
+    out['calmar'][:, live] = _calmar(out['ann_return'][:, live], depth)
+    return out
+
+
+def rolling_frame(daily_pnl: pd.Series, capital: float, window: int = TRADING_DAYS) -> pd.DataFrame:
+    """Rolling STAT_COLUMNS of one dated PnL series."""
+    stats = rolling_stats(daily_pnl.to_numpy(), capital, window)
+    return pd.DataFrame({name: values[0] for name, values in stats.items()}, index=daily_pnl.index)
+
+
+# --- ONLINE MODE ---
+
+class StreamingMetrics:
+    """
+    Running statistics of many PnL curves, extended one day (or block of
+    days) at a time. Return moments are merged with Chan's parallel
+    variance update and the drawdown state (account high, current
+    underwater run) is carried forward, so stats() after any sequence of
+    updates equals curve_stats() over the concatenated history. The last
+    `window` days are kept in a ring for the rolling figures.
+    """
+
+    _ARRAYS = ('count', 'mean', 'm2', 'n_down', 'down_mean', 'down_m2', 'cum_pnl', 'peak',
+               'drawdown', 'run', 'max_run', 'ring')
+
+    def __init__(self, num_curves: int, capital: float, window: int = TRADING_DAYS,
+                 names: Optional[Sequence[str]] = None):
+        self.capital = capital
+        self.window = window
+        self.names = list(names) if names is not None else list(range(num_curves))
+        self.count = 0
+        self.mean = np.zeros(num_curves)
+        self.m2 = np.zeros(num_curves)
+        self.n_down = np.zeros(num_curves, dtype=np.int64)
+        self.down_mean = np.zeros(num_curves)
+        self.down_m2 = np.zeros(num_curves)
+        self.cum_pnl = np.zeros(num_curves)
+        self.peak = np.full(num_curves, float(capital))
+        self.drawdown = np.zeros(num_curves)
+        self.run = np.zeros(num_curves, dtype=np.int64)
+        self.max_run = np.zeros(num_curves, dtype=np.int64)
+        self.ring = np.zeros((num_curves, window))
+
+    # --- UPDATES ---
+
+    def update(self, pnl: np.ndarray) -> 'StreamingMetrics':
+        """Absorbs one day of PnL per curve."""
+        return self.update_many(np.asarray(pnl, dtype=np.float64)[:, None])
+
+    def update_many(self, daily_pnl: np.ndarray) -> 'StreamingMetrics':
+        """Absorbs a (curves x days) block of PnL."""
+        daily_pnl = np.atleast_2d(np.asarray(daily_pnl, dtype=np.float64))
+        days = daily_pnl.shape[-1]
+        if days == 0:
+            return self
+        rets = daily_pnl / self.capital
+
+        # Return moments of the block, merged into the running ones
+        mean_b = rets.mean(axis=-1)
+        m2_b = ((rets - mean_b[:, None]) ** 2).sum(axis=-1)
+        total = self.count + days
+        delta = mean_b - self.mean
+        self.m2 += m2_b + delta ** 2 * self.count * days / total
+        self.mean += delta * days / total
+
+        losing = rets < 0
+        k_b = losing.sum(axis=-1)
+        dmean_b = np.where(losing, rets, 0.0).sum(axis=-1) / np.maximum(k_b, 1)
+        dm2_b = np.where(losing, (rets - dmean_b[:, None]) ** 2, 0.0).sum(axis=-1)
+        k = self.n_down + k_b
+        ddelta = dmean_b - self.down_mean
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.down_m2 += np.where(k > 0, dm2_b + ddelta ** 2 * self.n_down * k_b / k, 0.0)
+            self.down_mean += np.where(k > 0, ddelta * k_b / k, 0.0)
+        self.n_down = k
+        self.count = total
+
+        # Equity path continues from the carried account high and underwater run
+        equity = self.capital + self.cum_pnl[:, None] + np.cumsum(daily_pnl, axis=-1)
+        peak = np.maximum(np.maximum.accumulate(equity, axis=-1), self.peak[:, None])
+        self.drawdown = np.minimum(self.drawdown, (equity / peak - 1).min(axis=-1))
+        steps = np.arange(days)
+        last_high = np.maximum.accumulate(np.where(equity < peak, -1, steps), axis=-1)
+        run = np.where(last_high >= 0, steps - last_high, self.run[:, None] + steps + 1)
+        self.max_run = np.maximum(self.max_run, run.max(axis=-1))
+        self.run = run[:, -1]
+        self.peak = peak[:, -1]
+        self.cum_pnl = equity[:, -1] - self.capital
+
+        # Ring of the most recent `window` days
+        tail = daily_pnl[:, -self.window:]
+        self.ring = np.concatenate([self.ring[:, tail.shape[-1]:], tail], axis=-1)
+        return self
+
+    # --- RESULTS ---
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """STAT_COLUMNS over everything absorbed so far."""
+        n = max(self.count, 1)
+        final_ratio = (self.capital + self.cum_pnl) / self.capital
+        ann_return = (np.power(np.maximum(0.01, final_ratio), TRADING_DAYS / n) - 1) * 100
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(self.m2 / (self.count - 1))
+            sharpe = np.where(std > 0, self.mean / std * np.sqrt(TRADING_DAYS), 0.0)
+            down_std = np.sqrt(self.down_m2 / (self.n_down - 1))
+            sortino = np.where(self.n_down > 0, self.mean / down_std * np.sqrt(TRADING_DAYS), 0.0)
+        return {'ann_return': ann_return, 'sharpe': sharpe, 'sortino': sortino,
+                'max_drawdown': self.drawdown.copy(), 'max_dd_days': self.max_run.copy(),
+                'calmar': _calmar(ann_return, self.drawdown)}
+
+    def stats(self) -> pd.DataFrame:
+        return pd.DataFrame(self.arrays(), index=self.names, columns=list(STAT_COLUMNS))
+
+    def rolling(self) -> pd.DataFrame:
+        """Statistics of the trailing window (NaN until `window` days have been absorbed)."""
+        if self.count < self.window:
+            return pd.DataFrame(np.nan, index=self.names, columns=list(STAT_COLUMNS))
+        return pd.DataFrame(curve_stats(self.ring, self.capital), index=self.names, columns=list(STAT_COLUMNS))
+
+    # --- PERSISTENCE ---
+
+    def save(self, path: Path) -> None:
+        """Persists the running state as <path>/metrics.npz plus metrics.json."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.savez(path / 'metrics.npz', **{name: np.asarray(getattr(self, name)) for name in self._ARRAYS})
+        with open(path / 'metrics.json', 'w') as fh:
+            json.dump({'names': [str(n) for n in self.names], 'capital': self.capital,
+                       'window': self.window}, fh, indent=1)
+
+    @classmethod
+    def load(cls, path: Path) -> 'StreamingMetrics':
+        path = Path(path)
+        with open(path / 'metrics.json') as fh:
+            meta = json.load(fh)
+        arrays = np.load(path / 'metrics.npz')
+        state = cls(len(meta['names']), meta['capital'], meta['window'], meta['names'])
+        for name in cls._ARRAYS:
+            setattr(state, name, arrays[name].copy())
+        state.count = int(state.count)
+        return state
@@ -3,10 +3,20 @@ Trend Following Strategy Modules
 --------------------------------
 Implementation of the Société Générale Trend Indicator benchmark
 designed to replicate diversified CTA trend-following returns.
+
+Beyond the 20/120 crossover, signal models are registered by name in
+MODEL_REGISTRY. Each model declares its lookback and the indicators it
+reads; an IndicatorCache computes every distinct (indicator, window)
+once over the whole (dates x symbols) panel and serves it to all models
+of a run, so an ensemble costs roughly its distinct indicators.
 """
 
 import pandas as pd
 import numpy as np
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+from profiling import stage
 
 
 def generate_trend_signals(df: pd.DataFrame, short_window: int = 20, long_window: int = 120) -> pd.DataFrame:
@@ -29,4 +39,528 @@ def generate_trend_signals(df: pd.DataFrame, short_window: int = 20, long_window
     data.iloc[:long_window, data.columns.get_loc('Signal')] = 0
     data['Signal'] = data['Signal'].fillna(0).astype(int)
 
-    return data
\ No newline at end of file
+    return data
+
+
+# --- ROLLING WINDOW PRIMITIVES ---
+
+def cumulative(values: np.ndarray, valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Zero-padded running sums of `values` and of the valid-bar count along
+    axis 0. Every trailing window sum is then a single subtraction.
+    """
+    shape = (values.shape[0] + 1,) + values.shape[1:]
+    cs = np.zeros(shape, dtype=values.dtype)
+    cnt = np.zeros(shape, dtype=np.int64)
+    np.cumsum(values if valid.all() else np.where(valid, values, 0), axis=0, out=cs[1:])
+    np.cumsum(valid, axis=0, out=cnt[1:])
+    return cs, cnt
+
+
+def window_sum(cs: np.ndarray, cnt: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Trailing window sums from padded running sums (see `cumulative`).
+
+    Returns (sums, full) where `full` marks rows whose window holds
+    `window` valid observations; sums elsewhere are meaningless.
+    """
+    n = cs.shape[0] - 1
+    sums = np.zeros((n,) + cs.shape[1:], dtype=cs.dtype)
+    full = np.zeros((n,) + cs.shape[1:], dtype=bool)
+    if window <= n:
+        sums[window - 1:] = cs[window:] - cs[:-window]
+        full[window - 1:] = (cnt[window:] - cnt[:-window]) == window
+    return sums, full
+
+
+def rolling_sum(values: np.ndarray, valid: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Trailing window sums along axis 0; returns (sums, full) like `window_sum`."""
+    return window_sum(*cumulative(values, valid), window)
+
+
+def rolling_extreme(values: np.ndarray, window: int, op: Callable = np.maximum) -> np.ndarray:
+    """
+    Trailing window max (or min with op=np.minimum) along axis 0 in O(n)
+    regardless of the window: running extremes forward and backward inside
+    window-sized blocks, combined pairwise (van Herk / Gil-Werman).
+    Rows before the first full window hold the running extreme so far.
+    """
+    n = values.shape[0]
+    if n == 0 or window <= 1:
+        return values.copy()
+    pad = (-n) % window
+    padded = np.concatenate([values, np.repeat(values[-1:], pad, axis=0)])
+    blocks = padded.reshape((-1, window) + values.shape[1:])
+    forward = op.accumulate(blocks, axis=1).reshape(padded.shape)
+    backward = op.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(padded.shape)
+
+    out = op.accumulate(values, axis=0)
+    if window <= n:
+        out[window - 1:] = op(backward[:n - window + 1], forward[window - 1:n])
+    return out
+
+
+# --- PER-SYMBOL BARS ---
+
+def pack_bars(values: np.ndarray, valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Packs every column's bars from row 0, dropping dates without a bar, so
+    windows count each symbol's own bars as the serial engine does on a
+    frame holding only that market's rows.
+
+    Returns:
+        (packed, packed_valid, bar_index): the (bars x symbols) values, their
+        mask (False on the padding after a symbol's last bar) and the packed
+        row of every (date, symbol) cell (meaningless where there is no bar).
+        Dense panels are returned as they are.
+    """
+    bar_index = np.cumsum(valid, axis=0) - 1
+    if valid.all():
+        return values, valid, bar_index
+    rows, cols = np.nonzero(valid)
+    num_bars = int(bar_index[-1].max()) + 1 if values.shape[0] else 0
+    packed = np.zeros((num_bars,) + values.shape[1:], dtype=values.dtype)
+    packed_valid = np.zeros(packed.shape, dtype=bool)
+    packed[bar_index[rows, cols], cols] = values[rows, cols]
+    packed_valid[bar_index[rows, cols], cols] = True
+    return packed, packed_valid, bar_index
+
+
+def unpack_bars(packed: np.ndarray, valid: np.ndarray, bar_index: np.ndarray) -> np.ndarray:
+    """Maps a (bars x symbols) array from pack_bars back onto the dates (0 where no bar)."""
+    if valid.all():
+        return packed
+    values = np.zeros(valid.shape, dtype=packed.dtype)
+    rows, cols = np.nonzero(valid)
+    values[rows, cols] = packed[bar_index[rows, cols], cols]
+    return values
+
+
+def bar_window_sums(values: np.ndarray, valid: np.ndarray, windows: Iterable[int]) -> Dict[int, np.ndarray]:
+    """
+    Trailing sums over each symbol's last `window` bars for every window,
+    on the dates (0 where no bar). Bars before a symbol's window fills hold
+    partial sums; callers mask them with the bar count.
+    """
+    packed, packed_valid, bar_index = pack_bars(values, valid)
+    cs, cnt = cumulative(packed, packed_valid)
+    return {w: unpack_bars(window_sum(cs, cnt, w)[0], valid, bar_index) for w in windows}
+
+
+# --- PARAMETER SWEEP ---
+
+def trend_signal_sweep(close, short_windows: Sequence[int], long_windows: Sequence[int],
+                       valid: Optional[np.ndarray] = None) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+    """
+    Evaluates every (short, long) crossover in the grid from one shared
+    cumulative sum of Close. Each distinct window is summed once, so cost
+    grows with the number of distinct windows rather than with pairs.
+
+    Args:
+        close: Close prices, 1-D (dates) or 2-D (dates x symbols). Integer
+            inputs (e.g. Panel.ticks) give exact window sums.
+        short_windows, long_windows: Candidate lookbacks; pairs with
+            short >= long are skipped.
+        valid: Bar-present mask, required for integer inputs with gaps.
+
+    Returns:
+        (signals, pairs): int8 signals of shape (pairs x dates) or
+        (pairs x dates x symbols), and the (short, long) pair for each
+        leading index. Signals follow generate_trend_signals on each
+        symbol's own bars, including the per-pair long_window burn-in;
+        dates without a bar are 0.
+    """
+    values = np.asarray(close)
+    if valid is None:
+        valid = ~np.isnan(values) if values.dtype.kind == 'f' else np.ones(values.shape, dtype=bool)
+    if values.ndim == 1:
+        signals, pairs = trend_signal_sweep(values[:, None], short_windows, long_windows, valid[:, None])
+        return signals[..., 0], pairs
+
+    shorts, longs = sorted(set(short_windows)), sorted(set(long_windows))
+    pairs = [(s, l) for s in shorts for l in longs if s < l]
+    slot = {pair: i for i, pair in enumerate(pairs)}
+
+    used = [s for s in shorts if any(s < l for l in longs)]
+    sums = bar_window_sums(values, valid, used + [l for l in longs if any(s < l for s in used)])
+    bar_number = np.cumsum(valid, axis=0)
+
+    signals = np.empty((len(pairs),) + values.shape, dtype=np.int8)
+    lhs, rhs = np.empty(values.shape, dtype=values.dtype), np.empty(values.shape, dtype=values.dtype)
+    above = np.empty(values.shape, dtype=bool)
+    for l in longs:
+        paired = [s for s in used if s < l]
+        if not paired:
+            continue
+        live = (valid & (bar_number > l)).view(np.int8)
+        for s in paired:
+            # SMA_s > SMA_l  <=>  l * sum_s > s * sum_l, mapped to +1/-1 then burn-in masked
+            np.multiply(sums[s], l, out=lhs)
+            np.multiply(sums[l], s, out=rhs)
+            np.greater(lhs, rhs, out=above)
+            sig = signals[slot[(s, l)]]
+            np.multiply(above.view(np.int8), 2, out=sig)
+            sig -= 1
+            sig *= live
+
+    return signals, pairs
+
+
+# --- INDICATOR CACHE ---
+
+class IndicatorCache:
+    """
+    Indicators of one (dates x symbols) price panel, computed on first
+    request and shared by every model of a run. Prices are integer ticks
+    (Panel.ticks) so window sums and channel extremes are exact.
+
+    Kinds:
+        sum     trailing window sum of ticks (SMA = sum / window)
+        ema     exponential moving average of ticks, alpha = 2 / (window + 1)
+        high    trailing window maximum
+        low     trailing window minimum
+        change  ticks minus the ticks `window` bars earlier
+
+    Windows count each symbol's own bars, as the serial engine does on a
+    frame holding only that market's rows: dates without a bar (a late
+    start or an interior gap) are skipped, not counted. Values on those
+    dates are meaningless and are masked by SignalModel.signal().
+    """
+
+    def __init__(self, ticks: np.ndarray, valid: np.ndarray):
+        self.ticks = ticks
+        self.valid = valid
+        self._values: Dict[Tuple[str, int], np.ndarray] = {}
+        self._cumulative: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._bars: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def bar_number(self) -> np.ndarray:
+        """Valid bars seen per symbol up to and including each row."""
+        return self.running_sums()[1][1:]
+
+    def running_sums(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Padded cumulative ticks and bar counts, shared by every window sum."""
+        if self._cumulative is None:
+            self._cumulative = cumulative(self.ticks, self.valid)
+        return self._cumulative
+
+    def bar_panel(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Every symbol's bars packed from row 0 (see pack_bars), computed once."""
+        if self._bars is None:
+            self._bars = pack_bars(self.ticks, self.valid)
+        return self._bars
+
+    def _unpack(self, packed: np.ndarray) -> np.ndarray:
+        """Maps a (bars x symbols) indicator back onto the dates (0 where no bar)."""
+        return unpack_bars(packed, self.valid, self.bar_panel()[2])
+
+    def prepare(self, specs: Iterable[Tuple[str, int]]) -> None:
+        """Computes every missing indicator; all EMA windows share one pass over the dates."""
+        missing = sorted({spec for spec in specs if spec not in self._values})
+        emas = [w for kind, w in missing if kind == 'ema']
+        if emas:
+            with stage('indicator', kind='ema', windows=len(emas)):
+                for w, values in zip(emas, _ema_pass(self.ticks, self.valid, emas)):
+                    self._values[('ema', w)] = values
+                    self.misses += 1
+        for spec in missing:
+            if spec not in self._values:
+                self.get(*spec)
+
+    def get(self, kind: str, window: int) -> np.ndarray:
+        key = (kind, window)
+        values = self._values.get(key)
+        if values is not None:
+            self.hits += 1
+            return values
+        self.misses += 1
+        with stage('indicator', kind=kind, window=window):
+            if kind == 'ema':
+                # Carries the last value over missing dates, so it already advances per bar
+                values = _ema_pass(self.ticks, self.valid, [window])[0]
+            elif kind in ('sum', 'high', 'low', 'change'):
+                packed, packed_valid, _ = self.bar_panel()
+                if kind == 'sum':
+                    bars = rolling_sum(packed, packed_valid, window)[0]
+                elif kind == 'change':
+                    bars = np.zeros_like(packed)
+                    bars[window:] = packed[window:] - packed[:-window]
+                else:
+                    fill = np.iinfo(np.int64).min if kind == 'high' else np.iinfo(np.int64).max
+                    bars = rolling_extreme(np.where(packed_valid, packed, fill), window,
+                                           np.maximum if kind == 'high' else np.minimum)
+                values = self._unpack(bars)
+            else:
+                raise ValueError(f"Unknown indicator kind: {kind}")
+        self._values[key] = values
+        return values
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+def _ema_pass(ticks: np.ndarray, valid: np.ndarray, windows: Sequence[int]) -> List[np.ndarray]:
+    """EMAs for several windows in one walk over the dates; missing bars carry the last value."""
+    alpha = (2.0 / (np.asarray(windows, dtype=np.float64) + 1))[:, None]
+    out = np.empty((len(windows),) + ticks.shape)
+    current = np.full((len(windows),) + ticks.shape[1:], np.nan)
+    prices = ticks.astype(np.float64)
+    for t in range(ticks.shape[0]):
+        x, ok = prices[t], valid[t]
+        seeded = np.where(np.isnan(current), x, current + alpha * (x - current))
+        current = np.where(ok, seeded, current)
+        out[:, t] = current
+    return list(out)
+
+
+# --- SIGNAL MODEL REGISTRY ---
+
+MODEL_REGISTRY: Dict[str, Type['SignalModel']] = {}
+
+
+def register_model(name: str):
+    """Class decorator adding a SignalModel to MODEL_REGISTRY under `name`."""
+    def wrap(cls):
+        if getattr(cls, '__abstractmethods__', None):
+            raise TypeError(f"Signal model '{name}' does not implement: {', '.join(sorted(cls.__abstractmethods__))}")
+        cls.name = name
+        MODEL_REGISTRY[name] = cls
+        return cls
+    return wrap
+
+
+class SignalModel(ABC):
+    """
+    Base class of registered models. Subclasses declare `lookback` and
+    `indicators()` and map cached indicators to raw +1/-1 (or 0) signals;
+    signal() applies the MaxBarsBack burn-in of `lookback` bars.
+    """
+    name = 'model'
+
+    @property
+    @abstractmethod
+    def lookback(self) -> int:
+        """Bars of history needed before the first live signal."""
+
+    @abstractmethod
+    def indicators(self) -> List[Tuple[str, int]]:
+        """(kind, window) indicators read from the IndicatorCache."""
+
+    @abstractmethod
+    def raw_signal(self, cache: IndicatorCache) -> np.ndarray:
+        """+1/-1 (or 0) per (date, symbol) before the burn-in mask."""
+
+    def signal(self, cache: IndicatorCache) -> np.ndarray:
+        live = cache.valid & (cache.bar_number > self.lookback)
+        return np.where(live, self.raw_signal(cache), 0).astype(np.int8)
+
+    @property
+    def spec(self) -> str:
+        return ':'.join([self.name] + [str(v) for v in vars(self).values()])
+
+    def __repr__(self) -> str:
+        return self.spec
+
+
+@register_model('sma')
+class SMACrossover(SignalModel):
+    """Long when the fast SMA is above the slow SMA (generate_trend_signals on ticks)."""
+
+    def __init__(self, short_window: int = 20, long_window: int = 120):
+        if not 0 < short_window < long_window:
+            raise ValueError(f"Need 0 < short_window < long_window, got {short_window}/{long_window}")
+        self.short_window, self.long_window = short_window, long_window
+
+    @property
+    def lookback(self) -> int:
+        return self.long_window
+
+    def indicators(self) -> List[Tuple[str, int]]:
+        return [('sum', self.short_window), ('sum', self.long_window)]
+
+    def raw_signal(self, cache: IndicatorCache) -> np.ndarray:
+        s_sum, l_sum = cache.get('sum', self.short_window), cache.get('sum', self.long_window)
+        return np.where(self.long_window * s_sum > self.short_window * l_sum, 1, -1)
+
+
+@register_model('ema')
+class EMACrossover(SignalModel):
+    """Long when the fast EMA is above the slow EMA."""
+
+    def __init__(self, fast_window: int = 16, slow_window: int = 64):
+        if not 0 < fast_window < slow_window:
+            raise ValueError(f"Need 0 < fast_window < slow_window, got {fast_window}/{slow_window}")
+        self.fast_window, self.slow_window = fast_window, slow_window
+
+    @property
+    def lookback(self) -> int:
+        return self.slow_window
+
+    def indicators(self) -> List[Tuple[str, int]]:
+        return [('ema', self.fast_window), ('ema', self.slow_window)]
+
+    def raw_signal(self, cache: IndicatorCache) -> np.ndarray:
+        return np.where(cache.get('ema', self.fast_window) > cache.get('ema', self.slow_window), 1, -1)
+
+
+@register_model('breakout')
+class ChannelBreakout(SignalModel):
+    """
+    Donchian channel: goes long on a close at the `window`-bar high, short
+    on a close at the `window`-bar low, and holds in between (flat until
+    the first breakout).
+    """
+
+    def __init__(self, window: int = 55):
+        if window < 2:
+            raise ValueError(f"Breakout window must be at least 2, got {window}")
+        self.window = window
+
+    @property
+    def lookback(self) -> int:
+        return self.window
+
+    def indicators(self) -> List[Tuple[str, int]]:
+        return [('high', self.window), ('low', self.window)]
+
+    def raw_signal(self, cache: IndicatorCache) -> np.ndarray:
+        ticks = cache.ticks
+        live = cache.valid & (cache.bar_number >= self.window)
+        event = np.where(live & (ticks >= cache.get('high', self.window)), 1,
+                         np.where(live & (ticks <= cache.get('low', self.window)), -1, 0))
+        # Hold the latest breakout direction: forward-fill the rows of nonzero events
+        rows = np.where(event != 0, np.arange(event.shape[0]).reshape((-1,) + (1,) * (event.ndim - 1)), 0)
+        latest = np.maximum.accumulate(rows, axis=0)
+        return np.take_along_axis(event, latest, axis=0)
+
+
+@register_model('momentum')
+class TimeSeriesMomentum(SignalModel):
+    """Sign of the price change over the last `window` bars (+1 when up, -1 otherwise)."""
+
+    def __init__(self, window: int = 250):
+        if window < 1:
+            raise ValueError(f"Momentum window must be positive, got {window}")
+        self.window = window
+
+    @property
+    def lookback(self) -> int:
+        return self.window
+
+    def indicators(self) -> List[Tuple[str, int]]:
+        return [('change', self.window)]
+
+    def raw_signal(self, cache: IndicatorCache) -> np.ndarray:
+        return np.where(cache.get('change', self.window) > 0, 1, -1)
+
+
+def build_model(spec: str) -> SignalModel:
+    """Model from a spec such as 'sma:20:120', 'ema:16:64', 'breakout:55' or 'momentum:250'."""
+    name, *params = spec.split(':')
+    if name not in MODEL_REGISTRY:
+        raise ValueError(f"Unknown signal model '{name}' (registered: {', '.join(MODEL_REGISTRY)})")
+    return MODEL_REGISTRY[name](*(int(p) for p in params))
+
+
+DEFAULT_ENSEMBLE = ('sma:10:40', 'sma:10:100', 'sma:20:60', 'sma:20:120', 'sma:30:150', 'sma:40:160',
+                    'sma:50:200', 'ema:8:32', 'ema:12:48', 'ema:16:64', 'ema:32:128', 'ema:64:256',
+                    'breakout:20', 'breakout:55', 'breakout:100', 'breakout:200',
+                    'momentum:20', 'momentum:60', 'momentum:120', 'momentum:250')
+
+
+def ensemble_signal(models: Sequence[SignalModel], cache: IndicatorCache,
+                    weights: Optional[Sequence[float]] = None) -> np.ndarray:
+    """
+    Weighted average of the models' signals (float, within [-1, 1]). Every
+    indicator the models declare is prepared up front and computed once.
+
+    Raises ValueError unless there is one weight per model and the
+    weights do not sum to zero.
+    """
+    weights = np.ones(len(models)) if weights is None else np.asarray(weights, dtype=np.float64)
+    if weights.shape != (len(models),):
+        raise ValueError(f"Need one weight per model, got {weights.size} weights for {len(models)} models")
+    if weights.sum() == 0:
+        raise ValueError("Ensemble weights sum to zero")
+    cache.prepare(spec for model in models for spec in model.indicators())
+    blend = np.zeros(cache.ticks.shape)
+    for model, weight in zip(models, weights):
+        with stage('model', model=model.spec):
+            blend += weight * model.signal(cache)
+    return blend / weights.sum()
+
+
+# --- SERIAL CHECK ---
+
+def reference_signal(model: SignalModel, close: pd.Series) -> np.ndarray:
+    """
+    A model's signal on one market's own bars, written directly in pandas
+    (SMA crossovers through generate_trend_signals) as an independent
+    reference for the panel implementation.
+    """
+    if isinstance(model, SMACrossover):
+        frame = pd.DataFrame({'Close': close})
+        return generate_trend_signals(frame, model.short_window, model.long_window)['Signal'].to_numpy()
+    if isinstance(model, EMACrossover):
+        fast = close.ewm(span=model.fast_window, adjust=False).mean()
+        slow = close.ewm(span=model.slow_window, adjust=False).mean()
+        raw = pd.Series(np.where(fast > slow, 1, -1))
+    elif isinstance(model, ChannelBreakout):
+        high = close.rolling(model.window).max()
+        low = close.rolling(model.window).min()
+        event = pd.Series(np.where(close >= high, 1, np.where(close <= low, -1, np.nan)))
+        raw = event.ffill().fillna(0)
+    elif isinstance(model, TimeSeriesMomentum):
+        raw = pd.Series(np.where(close - close.shift(model.window) > 0, 1, -1))
+    else:
+        raise TypeError(f"No pandas reference for signal model '{model.name}'")
+    raw.iloc[:model.lookback] = 0
+    return raw.to_numpy().astype(int)
+
+
+def serial_mismatches(models: Sequence[SignalModel], ticks: np.ndarray, valid: np.ndarray) -> Dict[str, int]:
+    """
+    Cells where a model's panel signal differs from reference_signal on
+    each symbol's own bars (the serial engine's view). Dates without a bar
+    must be 0.
+    """
+    cache = IndicatorCache(ticks, valid)
+    counts = {}
+    for model in models:
+        panel_signal = model.signal(cache)
+        bad = int((panel_signal[~valid] != 0).sum())
+        for s in range(ticks.shape[1]):
+            rows = valid[:, s]
+            reference = reference_signal(model, pd.Series(ticks[rows, s].astype(np.float64)))
+            bad += int((panel_signal[rows, s] != reference).sum())
+        counts[model.spec] = bad
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Check panel signals against per-symbol evaluation on gappy data")
+    parser.add_argument('--models', nargs='*', default=list(DEFAULT_ENSEMBLE), metavar='SPEC')
+    parser.add_argument('--days', type=int, default=2000)
+    parser.add_argument('--symbols', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Random-walk ticks with late starts and interior gaps of random length
+    rng = np.random.default_rng(args.seed)
+    shape = (args.days, args.symbols)
+    check_ticks = np.cumsum(rng.integers(-5, 6, shape), axis=0) + 100_000
+    check_valid = np.arange(args.days)[:, None] >= rng.integers(0, args.days // 4, args.symbols)
+    for _ in range(args.symbols * 4):
+        start = rng.integers(0, args.days)
+        check_valid[start:start + rng.integers(1, 40), rng.integers(0, args.symbols)] = False
+    check_ticks = np.where(check_valid, check_ticks, 0)
+
+    result = serial_mismatches([build_model(spec) for spec in args.models], check_ticks, check_valid)
+    for spec, bad in result.items():
+        print(f"{spec:<16} {bad:>8} mismatched cells")
+    print(f"\n{'all models match' if not any(result.values()) else 'MISMATCH'} "
+          f"({int((~check_valid).sum())} missing cells of {check_valid.size})")
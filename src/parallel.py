@@ -0,0 +1,151 @@
+"""
+Process-Pool Backtest Execution
+-------------------------------
+Fans the per-market serial engine out to a pool of worker processes.
+The aligned Close matrix is placed in one shared-memory block that every
+worker maps at start-up, so tasks carry only column numbers and return
+only their PnL arrays; no DataFrames are pickled in either direction.
+
+Each symbol runs through the exact same backtest_symbol code as the
+serial path and the parent aggregates in the serial symbol order, so the
+sector PnL is identical to mode='serial'.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest import backtest_symbol, aggregate_sector_pnls
+from engine import SECTORS, INITIAL_CAPITAL, TARGET_DAILY_VOL, NUM_ASSETS, get_sector
+
+# Per-worker views onto the shared Close matrix (set by _attach)
+_WORKER: Dict[str, object] = {}
+
+
+def _attach(shm_name: str, shape: Tuple[int, int], dates: np.ndarray, risk_per_asset: float) -> None:
+    # Workers share the parent's resource tracker, so the parent's unlink releases the block
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _WORKER['shm'] = shm
+    _WORKER['close'] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _WORKER['dates'] = dates
+    _WORKER['risk'] = risk_per_asset
+
+
+def _run_columns(task: List[Tuple[int, str]]) -> List[Tuple[int, np.ndarray]]:
+    """Backtests a block of (column, symbol) pairs inside a worker."""
+    close, dates, risk = _WORKER['close'], _WORKER['dates'], _WORKER['risk']
+    results = []
+    for col, symbol in task:
+        prices = close[:, col]
+        valid = ~np.isnan(prices)
+        df = pd.DataFrame({'Date': dates[valid], 'Close': prices[valid]})
+        results.append((col, backtest_symbol(symbol, df, risk).to_numpy()))
+    return results
+
+
+def _make_tasks(symbols: Sequence[str], workers: int, by: str) -> List[List[Tuple[int, str]]]:
+    indexed = [(col, sym) for col, sym in enumerate(symbols) if get_sector(sym)]
+    if by == 'sector':
+        groups = [[(c, s) for c, s in indexed if get_sector(s) == sector] for sector in SECTORS]
+        return [g for g in groups if g]
+    if by != 'symbol':
+        raise ValueError(f"Unknown task split: {by}")
+    # A few tasks per worker keeps the pool balanced without per-symbol IPC overhead
+    size = max(1, -(-len(indexed) // (workers * 4)))
+    return [indexed[i:i + size] for i in range(0, len(indexed), size)]
+
+
+def parallel_symbol_pnls(dates: pd.DatetimeIndex, close: np.ndarray, symbols: Sequence[str],
+                         risk_per_asset: float, workers: Optional[int] = None,
+                         by: str = 'symbol') -> List[Tuple[str, pd.Series]]:
+    """
+    Runs backtest_symbol for every sector-mapped column of a
+    (dates x symbols) Close matrix on a process pool.
+
+    Args:
+        workers: Pool size (defaults to os.cpu_count()).
+        by: 'symbol' for balanced symbol blocks, 'sector' for one task per sector.
+
+    Returns:
+        (symbol, Net_PnL series) in column order, as the serial loop yields them.
+    """
+    workers = workers or os.cpu_count() or 1
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    date_values = np.asarray(pd.DatetimeIndex(dates).values)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(close.nbytes, 1))
+    try:
+        np.ndarray(close.shape, dtype=np.float64, buffer=shm.buf)[:] = close
+        tasks = _make_tasks(symbols, workers, by)
+
+        pnl_by_col = {}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(shm.name, close.shape, date_values, risk_per_asset)) as pool:
+            for block in pool.map(_run_columns, tasks):
+                pnl_by_col.update(block)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    results = []
+    for col in sorted(pnl_by_col):
+        valid = ~np.isnan(close[:, col])
+        index = pd.DatetimeIndex(date_values[valid], name='Date')
+        results.append((symbols[col], pd.Series(pnl_by_col[col], index=index, name='Net_PnL')))
+    return results
+
+
+def parallel_sector_pnls(dates: pd.DatetimeIndex, close: np.ndarray, symbols: Sequence[str],
+                         risk_per_asset: float, workers: Optional[int] = None,
+                         by: str = 'symbol') -> Optional[pd.DataFrame]:
+    """Process-pool equivalent of the serial sector PnL aggregation."""
+    sector_pnls = {sector: [] for sector in SECTORS}
+    for symbol, pnl in parallel_symbol_pnls(dates, close, symbols, risk_per_asset, workers, by):
+        sector_pnls[get_sector(symbol)].append(pnl)
+    return aggregate_sector_pnls(sector_pnls)
+
+
+# --- SERIAL VS PARALLEL BENCHMARK ---
+
+def _synthetic_universe(num_symbols: int, num_days: int, seed: int = 7) -> Tuple[pd.DatetimeIndex, np.ndarray, List[str]]:
+    """Random-walk Close matrix whose columns cycle through the traded symbols."""
+    rng = np.random.default_rng(seed)
+    base = [sym for syms in SECTORS.values() for sym in syms]
+    symbols = [base[i % len(base)] for i in range(num_symbols)]
+    dates = pd.bdate_range('2000-01-03', periods=num_days, name='Date')
+    close = np.round(100 + np.cumsum(rng.normal(0, 1, (num_days, num_symbols)), axis=0), 2)
+    return dates, np.maximum(close, 1.0), symbols
+
+
+def benchmark(universe_sizes: Sequence[int] = (57, 500), num_days: int = 6800,
+              workers: Optional[int] = None) -> None:
+    """Times the serial loop against the process pool and checks equality."""
+    workers = workers or os.cpu_count() or 1
+    risk_per_asset = INITIAL_CAPITAL * TARGET_DAILY_VOL / np.sqrt(NUM_ASSETS)
+    for n in universe_sizes:
+        dates, close, symbols = _synthetic_universe(n, num_days)
+
+        start = time.perf_counter()
+        serial = {sector: [] for sector in SECTORS}
+        for col, symbol in enumerate(symbols):
+            df = pd.DataFrame({'Date': dates, 'Close': close[:, col]})
+            serial[get_sector(symbol)].append(backtest_symbol(symbol, df, risk_per_asset))
+        serial = aggregate_sector_pnls(serial)
+        t_serial = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pooled = parallel_sector_pnls(dates, close, symbols, risk_per_asset, workers)
+        t_pool = time.perf_counter() - start
+
+        print(f"{n:>5} symbols | serial {t_serial:6.2f}s | {workers} workers {t_pool:6.2f}s | "
+              f"speedup {t_serial / t_pool:4.1f}x | identical: {serial.equals(pooled)}")
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(workers=int(sys.argv[1]) if len(sys.argv) > 1 else None)
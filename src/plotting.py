@@ -0,0 +1,272 @@
+"""
+Performance Chart Rendering
+---------------------------
+Builds the sector/portfolio equity chart on a caller-supplied Figure so
+the same drawing code serves the interactive window (main.py) and the
+headless report (report.py, Agg canvas, no pyplot).
+
+Curves are reduced to screen resolution with Largest-Triangle-Three-
+Buckets (LTTB) downsampling, which keeps the visual extremes of each
+curve while drawing a few thousand points instead of every daily bar.
+
+CurveHover makes charts of many curves responsive: the hovered curve is
+found with a binary search on the sorted dates plus one row of values
+(no per-line hit testing), only the highlight and tooltip are redrawn
+(blitting), and the visible range is re-decimated with min/max buckets
+whenever the x-limits change, so zooming in reveals every bar.
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.patches import Patch
+from matplotlib.ticker import StrMethodFormatter, MultipleLocator
+
+SECTOR_COLORS = ['#0077FF', '#FF8800', '#00CC44', '#FF3333', '#AA33FF', '#00CCCC']
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of `threshold` points (always including the first
+    and last) that best preserve the visual shape of y(x).
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.append(np.linspace(1, n - 1, threshold - 1).astype(np.intp), n)
+
+    keep = np.empty(threshold, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = edges[i + 1], edges[i + 2]
+        avg_x, avg_y = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(curve: pd.Series, max_points: Optional[int]) -> pd.Series:
+    """LTTB-reduces a date-indexed curve to at most `max_points` points."""
+    if not max_points or len(curve) <= max_points:
+        return curve
+    x = curve.index.asi8 if isinstance(curve.index, pd.DatetimeIndex) else curve.index.to_numpy()
+    return curve.iloc[lttb(x, curve.to_numpy(), max_points)]
+
+
+def minmax_indices(values: np.ndarray, start: int, stop: int, buckets: int) -> np.ndarray:
+    """
+    Level-of-detail decimation of rows [start, stop) of a (dates x curves)
+    matrix: the rows of each curve's minimum and maximum in every one of
+    `buckets` equal slices, in date order. Vectorized across curves;
+    returns (curves x 2*buckets) row indices.
+    """
+    width = -(-(stop - start) // buckets)
+    rows = np.arange(start, start + width * buckets).reshape(buckets, width)
+    np.minimum(rows, stop - 1, out=rows)
+    block = values[rows]                                   # (buckets x width x curves)
+    nan = np.isnan(block)
+    lo = np.argmin(np.where(nan, np.inf, block), axis=1)
+    hi = np.argmax(np.where(nan, -np.inf, block), axis=1)
+    first, second = np.minimum(lo, hi), np.maximum(lo, hi)
+    picks = np.stack([first, second], axis=1) + (rows[:, :1])[:, :, None]   # (buckets x 2 x curves)
+    return picks.reshape(2 * buckets, -1).T
+
+
+class CurveHover:
+    """
+    Hover tooltips, highlighting and zoom-adaptive detail for many curves
+    sharing one sorted date axis.
+
+    Args:
+        lines: One plotted Line2D per column of `values`.
+        dates: Sorted dates of the rows of `values`.
+        values: (dates x curves) full-resolution data, NaN where absent.
+        format_tip: (label, date, value) -> tooltip text.
+        tolerance: Hit distance in pixels from the nearest curve.
+    """
+
+    def __init__(self, ax, lines: Sequence[Line2D], dates: pd.DatetimeIndex, values: np.ndarray,
+                 format_tip: Callable[[str, pd.Timestamp, float], str], tolerance: float = 8.0,
+                 highlight_width: float = 3.0):
+        self.ax, self.lines = ax, list(lines)
+        self.canvas = ax.figure.canvas
+        self.dates = pd.DatetimeIndex(dates)
+        self.x = mdates.date2num(self.dates)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.format_tip = format_tip
+        self.tolerance = tolerance
+        self.background = None
+        self.current: Optional[Tuple[int, int]] = None
+
+        # Animated artists are skipped by full redraws and painted only on blit
+        self.overlay = Line2D([], [], linewidth=highlight_width, zorder=50, animated=True)
+        ax.add_line(self.overlay)
+        self.annot = ax.annotate("", xy=(0, 0), xytext=(15, 15), textcoords="offset points", animated=True,
+                                 bbox=dict(boxstyle="round,pad=0.3", fc="#FFFFCC", ec="black", alpha=0.9),
+                                 arrowprops=dict(arrowstyle="->"), zorder=51)
+        self.annot.set_visible(False)
+        self.overlay.set_visible(False)
+
+        self.refresh_detail()
+        self._cids = [self.canvas.mpl_connect('draw_event', self._on_draw),
+                      self.canvas.mpl_connect('motion_notify_event', self._on_move)]
+        self._xlim_cid = ax.callbacks.connect('xlim_changed', lambda _ax: self.refresh_detail())
+
+    # --- LEVEL OF DETAIL ---
+
+    def refresh_detail(self) -> None:
+        """Re-decimates the visible date range to about two points per pixel column."""
+        lo, hi = self.ax.get_xlim()
+        start = max(0, int(np.searchsorted(self.x, lo)) - 1)
+        stop = min(len(self.x), int(np.searchsorted(self.x, hi, side='right')) + 1)
+        if stop - start < 2:
+            return
+        buckets = max(2, int(self.ax.bbox.width))
+        dates = self.dates.values
+        if stop - start <= 2 * buckets:
+            for c, line in enumerate(self.lines):
+                line.set_data(dates[start:stop], self.values[start:stop, c])
+        else:
+            picks = minmax_indices(self.values, start, stop, buckets)
+            for c, line in enumerate(self.lines):
+                line.set_data(dates[picks[c]], self.values[picks[c], c])
+        if self.current is not None:
+            self.overlay.set_data(self.lines[self.current[0]].get_data())
+
+    # --- HOVER ---
+
+    def nearest(self, x: float, y_pixel: float) -> Optional[Tuple[int, int]]:
+        """(curve, row) of the point closest to the cursor at the nearest date, within tolerance."""
+        i = int(np.searchsorted(self.x, x))
+        if i >= len(self.x) or (i > 0 and x - self.x[i - 1] < self.x[i] - x):
+            i -= 1
+        row = self.values[i]
+        if np.isnan(row).all():
+            return None
+        pixels = self.ax.transData.transform(np.column_stack([np.full(row.shape, self.x[i]), row]))[:, 1]
+        distance = np.abs(np.where(np.isnan(row), np.inf, pixels) - y_pixel)
+        c = int(np.argmin(distance))
+        return (c, i) if distance[c] <= self.tolerance else None
+
+    def _on_move(self, event) -> None:
+        target = self.nearest(event.xdata, event.y) if event.inaxes is self.ax else None
+        if target == self.current:
+            return
+        self.current = target
+        if target is not None:
+            c, i = target
+            line = self.lines[c]
+            self.overlay.set_data(line.get_data())
+            self.overlay.set_color(line.get_color())
+            self.annot.xy = (self.x[i], self.values[i, c])
+            self.annot.set_text(self.format_tip(line.get_label(), self.dates[i], self.values[i, c]))
+            self.annot.get_bbox_patch().set_edgecolor(line.get_color())
+        self.overlay.set_visible(target is not None)
+        self.annot.set_visible(target is not None)
+        self._blit()
+
+    def _on_draw(self, event) -> None:
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._paint()
+
+    def _paint(self) -> None:
+        if self.current is not None:
+            self.ax.draw_artist(self.overlay)
+            self.ax.draw_artist(self.annot)
+
+    def _blit(self) -> None:
+        if self.background is None or not getattr(self.canvas, 'supports_blit', False):
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.background)
+        self._paint()
+        self.canvas.blit(self.canvas.figure.bbox)
+
+    def disconnect(self) -> None:
+        for cid in self._cids:
+            self.canvas.mpl_disconnect(cid)
+        self.ax.callbacks.disconnect(self._xlim_cid)
+
+
+def screen_points(fig: Figure, dpi: Optional[float] = None) -> int:
+    """Two points per horizontal pixel of the figure is visually lossless."""
+    return int(fig.get_figwidth() * (dpi or fig.dpi) * 2)
+
+
+def build_performance_figure(fig: Figure, equity: pd.DataFrame,
+                             stats: Optional[Dict[str, float]] = None,
+                             max_points: Optional[int] = None) -> Tuple[object, List[Line2D]]:
+    """
+    Draws sector equity curves and the total portfolio onto `fig`.
+
+    Args:
+        equity: Account-value curves indexed by Date; one column per sector
+            plus 'TOTAL PORTFOLIO'.
+        stats: ann_return / sharpe / sortino (and optionally max_drawdown,
+            calmar) for the metrics overlay.
+        max_points: Per-curve point budget for LTTB (None draws every bar).
+
+    Returns:
+        (axes, plotted lines) for callers that add interactivity.
+    """
+    ax = fig.subplots()
+    fig.suptitle("BACKTEST RESULTS FOR SOCIETE GENERALE TREND INDICATOR",
+                 fontsize=20, fontweight='bold', color='#1a1a1a', y=0.95)
+    ax.set_facecolor('white')
+    plot_lines = []
+
+    sectors = [c for c in equity.columns if c != 'TOTAL PORTFOLIO']
+    for i, sector_name in enumerate(sectors):
+        curve = downsample(equity[sector_name], max_points)
+        line, = ax.plot(curve, label=sector_name, linewidth=2.3, color=SECTOR_COLORS[i % len(SECTOR_COLORS)])
+        plot_lines.append(line)
+
+    equity_curve = equity['TOTAL PORTFOLIO']
+    total_line, = ax.plot(downsample(equity_curve, max_points), color='black', linewidth=4.2,
+                          label='TOTAL PORTFOLIO', zorder=10)
+    plot_lines.append(total_line)
+
+    # Attribution Overlays
+    leg1 = ax.legend(loc='upper left', frameon=True, shadow=True, fontsize=15, title="SECTORS")
+    ax.add_artist(leg1)
+
+    if stats:
+        stats_text = (f"  ANNUALIZED RETURN │ {stats['ann_return']:>8.2f}%\n"
+                      f"  SHARPE RATIO      │ {stats['sharpe']:>8.2f}\n"
+                      f"  SORTINO RATIO     │ {stats['sortino']:>8.2f}")
+        if 'max_drawdown' in stats and 'calmar' in stats:
+            stats_text += (f"\n  MAX DRAWDOWN      │ {stats['max_drawdown'] * 100:>8.2f}%\n"
+                           f"  CALMAR RATIO      │ {stats['calmar']:>8.2f}")
+
+        ax.legend([Patch(visible=False)], [stats_text], loc='upper left', bbox_to_anchor=(0.22, 1.0),
+                  frameon=True, shadow=True, handlelength=0, title="PERFORMANCE METRICS",
+                  prop={'family': 'monospace', 'size': 15, 'weight': 'bold'})
+
+    # Scaling and Label Configuration
+    ax.set_xlim(left=pd.Timestamp('2000-01-01'), right=equity_curve.index.max())
+    ax.set_ylim(bottom=0, top=max(20_000_000, equity_curve.max() * 1.1))
+
+    ax.xaxis.set_major_locator(mdates.YearLocator(1))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
+    ax.yaxis.set_major_locator(MultipleLocator(5_000_000))
+    ax.yaxis.set_major_formatter(StrMethodFormatter('${x:,.0f}'))
+
+    # Original Labeling Styles
+    ax.set_ylabel('Account Value', fontsize=22, fontweight='bold', labelpad=50)
+    ax.set_xlabel('Date', fontsize=22, fontweight='bold', labelpad=25)
+
+    ax.grid(True, linestyle=':', color='lightgray', alpha=0.8)
+    fig.subplots_adjust(left=0.13, right=0.96, top=0.90, bottom=0.12)
+    return ax, plot_lines
@@ -0,0 +1,227 @@
+"""
+Pipeline Instrumentation
+------------------------
+Opt-in stage profiler for the backtest pipeline. Code marks its stages
+with `stage(name, symbol=...)`; while no profiler is active that call
+returns a shared no-op context manager, so instrumented code pays one
+global lookup per stage.
+
+An active Profiler records, per span:
+    wall time (start and duration, per thread),
+    net Python allocator blocks (sys.getallocatedblocks delta),
+    traced memory growth and high-water mark inside the span (tracemalloc,
+        which also sees NumPy buffers; optional because it slows pandas code),
+    process RSS high-water mark at span exit.
+
+tracemalloc keeps one process-wide peak, and measuring a span means
+resetting it. Only main-thread spans do that, so spans opened on worker
+threads (the prefetching loader, executor pools) report their memory
+figures as null. Main-thread figures include whatever those threads
+allocate meanwhile.
+
+Spans export as structured JSON (events plus a per-stage summary) and as
+Chrome trace-event JSON for chrome://tracing or https://ui.perfetto.dev.
+
+    with profiled(track_memory=True) as prof:
+        compute_sector_pnls('serial')
+    prof.export_json('profile.json'); prof.export_chrome_trace('trace.json')
+"""
+
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+_NULL = contextlib.nullcontext()
+_ACTIVE: Optional['Profiler'] = None
+
+
+def _rss_high_water_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'args', 'start', 'blocks', 'traced', 'child_peak', 'tracked')
+
+    def __init__(self, profiler: 'Profiler', name: str, args: Dict[str, object]):
+        self.profiler, self.name, self.args = profiler, name, args
+
+    def __enter__(self) -> '_Span':
+        prof = self.profiler
+        prof._stack().append(self)
+        self.child_peak = 0
+        # reset_peak() is process-wide: only the main thread may own the peak
+        self.tracked = prof.track_memory and threading.current_thread() is threading.main_thread()
+        if self.tracked:
+            self.traced = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.blocks = sys.getallocatedblocks()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        end = time.perf_counter_ns()
+        prof = self.profiler
+        event = {'name': self.name, 'ts_us': (self.start - prof.origin) / 1e3,
+                 'dur_us': (end - self.start) / 1e3, 'tid': threading.get_ident(),
+                 'blocks_delta': sys.getallocatedblocks() - self.blocks,
+                 'rss_high_water_mb': round(_rss_high_water_mb(), 1)}
+        stack = prof._stack()
+        stack.pop()
+        if self.tracked:
+            current, peak = tracemalloc.get_traced_memory()
+            # Child spans reset the tracemalloc peak, so fold their peaks back in
+            peak = max(peak, self.child_peak)
+            event['mem_delta_bytes'] = current - self.traced
+            event['mem_peak_bytes'] = peak - self.traced
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        elif prof.track_memory:
+            event['mem_delta_bytes'] = event['mem_peak_bytes'] = None
+        if self.args:
+            event['args'] = self.args
+        with prof._lock:
+            prof.events.append(event)
+        return False
+
+
+class Profiler:
+    """Collects stage spans from every thread of the current process."""
+
+    def __init__(self, track_memory: bool = False):
+        self.track_memory = track_memory
+        self.events: List[Dict[str, object]] = []
+        self.origin = time.perf_counter_ns()
+        self.started_at = time.time()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._owns_tracemalloc = False
+
+    def _stack(self) -> List[_Span]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def span(self, name: str, args: Dict[str, object]) -> _Span:
+        return _Span(self, name, args)
+
+    def start(self) -> 'Profiler':
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        return self
+
+    def stop(self) -> None:
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+
+    # --- REPORTING ---
+
+    def summary(self) -> pd.DataFrame:
+        """Per-stage call count, total/mean/max wall time and memory high-water marks."""
+        if not self.events:
+            return pd.DataFrame()
+        df = pd.DataFrame(self.events)
+        df['seconds'] = df['dur_us'] / 1e6
+        aggs = {'calls': ('seconds', 'size'), 'total_seconds': ('seconds', 'sum'),
+                'mean_ms': ('dur_us', lambda d: d.mean() / 1e3), 'max_ms': ('dur_us', lambda d: d.max() / 1e3),
+                'blocks_delta': ('blocks_delta', 'sum'), 'rss_high_water_mb': ('rss_high_water_mb', 'max')}
+        if 'mem_peak_bytes' in df:
+            aggs['mem_peak_mb'] = ('mem_peak_bytes', lambda b: pd.to_numeric(b).max() / 2 ** 20)
+        return df.groupby('name').agg(**aggs).sort_values('total_seconds', ascending=False)
+
+    def symbol_summary(self) -> pd.DataFrame:
+        """Wall seconds per (symbol x stage) for spans tagged with a symbol."""
+        rows = [(e['args']['symbol'], e['name'], e['dur_us'] / 1e6)
+                for e in self.events if 'symbol' in e.get('args', {})]
+        if not rows:
+            return pd.DataFrame()
+        df = pd.DataFrame(rows, columns=['symbol', 'name', 'seconds'])
+        return df.pivot_table(index='symbol', columns='name', values='seconds', aggfunc='sum')
+
+    def to_dict(self) -> Dict[str, object]:
+        summary = self.summary()
+        return {
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'track_memory': self.track_memory,
+            'summary': summary.reset_index().to_dict(orient='records') if not summary.empty else [],
+            'events': self.events,
+        }
+
+    def export_json(self, path: Path) -> None:
+        with open(path, 'w') as fh:
+            json.dump(self.to_dict(), fh, indent=1, default=float)
+
+    def export_chrome_trace(self, path: Path) -> None:
+        """Trace Event Format 'complete' events; traces from several runs can be loaded side by side."""
+        pid = os.getpid()
+        trace = []
+        for e in self.events:
+            args = dict(e.get('args', {}))
+            args.update({k: e[k] for k in ('blocks_delta', 'mem_delta_bytes', 'mem_peak_bytes',
+                                           'rss_high_water_mb') if k in e})
+            trace.append({'name': e['name'], 'cat': 'symbol' if 'symbol' in args else 'stage', 'ph': 'X',
+                          'ts': e['ts_us'], 'dur': e['dur_us'], 'pid': pid, 'tid': e['tid'], 'args': args})
+        with open(path, 'w') as fh:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, fh, default=float)
+
+    def export(self, folder: Path, prefix: str = 'profile') -> None:
+        """Writes <prefix>.json and <prefix>.trace.json into `folder`."""
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        self.export_json(folder / f"{prefix}.json")
+        self.export_chrome_trace(folder / f"{prefix}.trace.json")
+
+
+# --- MODULE-LEVEL SWITCH ---
+
+def stage(name: str, **args):
+    """Marks a pipeline stage; a no-op unless a profiler is enabled."""
+    prof = _ACTIVE
+    if prof is None:
+        return _NULL
+    return _Span(prof, name, args)
+
+
+def enable(track_memory: bool = False) -> Profiler:
+    """Activates a new process-wide profiler (replacing any active one)."""
+    global _ACTIVE
+    disable()
+    _ACTIVE = Profiler(track_memory).start()
+    return _ACTIVE
+
+
+def disable() -> Optional[Profiler]:
+    """Deactivates and returns the current profiler, if any."""
+    global _ACTIVE
+    prof, _ACTIVE = _ACTIVE, None
+    if prof is not None:
+        prof.stop()
+    return prof
+
+
+def active() -> Optional[Profiler]:
+    return _ACTIVE
+
+
+@contextlib.contextmanager
+def profiled(track_memory: bool = False) -> Iterator[Profiler]:
+    """Profiles the enclosed block: `with profiled() as prof: ...`."""
+    prof = enable(track_memory)
+    try:
+        yield prof
+    finally:
+        if _ACTIVE is prof:
+            disable()
@@ -0,0 +1,230 @@
+"""
+Headless Batch Report
+---------------------
+Display-free entry point for cron and CI runs. Computes the portfolio,
+writes metrics.json, equity_curves.csv and rolling_1y.csv to an output
+folder and never imports matplotlib unless a chart is requested; the
+chart is then drawn on an Agg canvas (no pyplot, no GUI toolkit) with
+every curve LTTB-downsampled to the pixel width of the image.
+
+    python report.py --out reports/latest [--plot] [--mode serial]
+"""
+
+import time
+
+_STARTED = time.perf_counter()
+
+import json
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from backtest import backtest_symbol, aggregate_sector_pnls
+from engine import SECTORS, INITIAL_CAPITAL, TARGET_DAILY_VOL, NUM_ASSETS
+from metrics import STAT_COLUMNS, curve_stats, rolling_frame, summarize
+from loader import DEFAULT_DEPTH, SymbolLoader
+from store import load_store, default_data_folder
+from panel import build_panel, run_panel_backtest, run_ensemble_backtest
+from models import DEFAULT_ENSEMBLE
+from profiling import stage
+from cache import ResultCache
+
+
+def compute_sector_pnls(mode: str = 'serial', data_folder: Optional[Path] = None,
+                        workers: Optional[int] = None, cache: Optional[ResultCache] = None,
+                        models: Optional[Sequence[str]] = None,
+                        prefetch: int = DEFAULT_DEPTH) -> Optional[pd.DataFrame]:
+    """
+    Runs the model over every market and returns daily PnL per sector
+    (Date index, one column per sector), or None when there is no data.
+
+    Modes:
+        serial: one DataFrame per symbol through generate_trend_signals.
+        panel:  whole-universe (dates x symbols) matrix engine (panel.py).
+        parallel: serial engine fanned out to `workers` processes (parallel.py).
+        compact: low-memory serial engine on compact dtypes (compact.py).
+        voltarget: panel engine scaled to a portfolio volatility target with
+            an incremental EWMA covariance (risk.py).
+        ensemble: panel engine on an equal-weight blend of registered signal
+            models (`models` specs, DEFAULT_ENSEMBLE when None).
+
+    `cache` (serial mode) reuses per-symbol signal, range and PnL arrays
+    from earlier runs whose inputs match (cache.py). `prefetch` (serial
+    mode) bounds the symbols loaded at once, the one being computed
+    included (loader.py; 1 reads serially).
+    """
+    capital = INITIAL_CAPITAL
+
+    # Portfolio Risk Budgeting
+    target_daily_vol_dollars = capital * TARGET_DAILY_VOL
+    risk_per_asset = target_daily_vol_dollars / np.sqrt(NUM_ASSETS)
+
+    data_folder = Path(data_folder) if data_folder is not None else default_data_folder()
+    if not data_folder.exists():
+        return None
+
+    if mode in ('panel', 'ensemble', 'voltarget'):
+        with stage('load'):
+            panel = build_panel(data_folder=data_folder)
+        if panel is None or not panel.symbols:
+            return None
+        if mode == 'ensemble':
+            return run_ensemble_backtest(panel, models or DEFAULT_ENSEMBLE, capital=capital)
+        if mode == 'voltarget':
+            from risk import run_vol_target_backtest
+            return run_vol_target_backtest(panel, capital=capital)
+        return run_panel_backtest(panel, capital=capital)
+    if mode == 'parallel':
+        from parallel import parallel_sector_pnls
+        with stage('load'):
+            store = load_store(data_folder)
+        if store is None:
+            return None
+        with stage('parallel_pool'):
+            return parallel_sector_pnls(store.dates, store.field('Close'), store.symbols, risk_per_asset, workers)
+    if mode == 'compact':
+        from compact import compact_sector_pnls
+        with stage('load'):
+            store = load_store(data_folder)
+        return compact_sector_pnls(store) if store is not None else None
+    if mode != 'serial':
+        raise ValueError(f"Unknown backtest mode: {mode}")
+
+    sector_pnls = {sector: [] for sector in SECTORS}
+
+    # Binary store when available, legacy per-symbol CSV files otherwise; upcoming symbols load while one computes
+    loader = SymbolLoader(data_folder, traded_only=True, depth=prefetch)
+    for (symbol, df), current_sector in zip(loader, loader.specs.sectors):
+        sector_pnls[current_sector].append(backtest_symbol(symbol, df, risk_per_asset, cache=cache))
+
+    return aggregate_sector_pnls(sector_pnls)
+
+
+def equity_curves(sector_daily: pd.DataFrame, capital: float = INITIAL_CAPITAL) -> pd.DataFrame:
+    """Account value per sector (in SECTORS order) plus the TOTAL PORTFOLIO curve."""
+    sectors = [s for s in SECTORS if s in sector_daily]
+    equity = capital + sector_daily[sectors].cumsum()
+    equity['TOTAL PORTFOLIO'] = capital + sector_daily.sum(axis=1).cumsum()
+    return equity
+
+
+def curve_table(sector_daily: pd.DataFrame, capital: float = INITIAL_CAPITAL) -> pd.DataFrame:
+    """STAT_COLUMNS for every sector plus TOTAL PORTFOLIO, evaluated as one matrix."""
+    with stage('metrics'):
+        curves = sector_daily.copy()
+        curves['TOTAL PORTFOLIO'] = sector_daily.sum(axis=1)
+        stats = curve_stats(curves.to_numpy().T, capital)
+        return pd.DataFrame(stats, index=curves.columns, columns=list(STAT_COLUMNS))
+
+
+def performance_stats(sector_daily: pd.DataFrame, capital: float = INITIAL_CAPITAL) -> Dict[str, float]:
+    """Headline statistics of the total portfolio's daily PnL."""
+    with stage('metrics'):
+        overall = sector_daily.sum(axis=1).to_numpy()
+        return _stat_dict(summarize(overall, capital).iloc[0])
+
+
+def _stat_dict(row: pd.Series) -> Dict[str, float]:
+    return {name: int(row[name]) if name == 'max_dd_days' else float(row[name]) for name in STAT_COLUMNS}
+
+
+def render_png(equity: pd.DataFrame, stats: Dict[str, float], path: Path, dpi: int = 100) -> None:
+    """Draws the performance chart on a non-interactive Agg canvas."""
+    with stage('plot'):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from plotting import build_performance_figure, screen_points
+
+        fig = Figure(figsize=(22, 11), dpi=dpi)
+        FigureCanvasAgg(fig)
+        build_performance_figure(fig, equity, stats, max_points=screen_points(fig))
+        fig.savefig(path, dpi=dpi, bbox_inches='tight')
+
+
+def write_report(out_dir: Path, mode: str = 'panel', workers: Optional[int] = None,
+                 data_folder: Optional[Path] = None, plot: bool = False, dpi: int = 100,
+                 capital: float = INITIAL_CAPITAL, cache: Optional[ResultCache] = None,
+                 models: Optional[Sequence[str]] = None) -> Optional[Dict[str, object]]:
+    """
+    Backtests the portfolio and writes <out_dir>/metrics.json,
+    <out_dir>/equity_curves.csv, the portfolio's trailing 1-year statistics
+    to <out_dir>/rolling_1y.csv and, with plot=True, performance.png.
+
+    Returns the metrics document, or None when there is no market data.
+    """
+    start = time.perf_counter()
+    with stage('backtest', mode=mode):
+        sector_daily = compute_sector_pnls(mode, data_folder, workers, cache, models)
+    if sector_daily is None or sector_daily.empty:
+        return None
+    computed = time.perf_counter()
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    equity = equity_curves(sector_daily, capital)
+    table = curve_table(sector_daily, capital)
+    with stage('metrics'):
+        rolling = rolling_frame(sector_daily.sum(axis=1), capital)
+    with stage('write'):
+        equity.to_csv(out_dir / 'equity_curves.csv', float_format='%.2f')
+        rolling.dropna().to_csv(out_dir / 'rolling_1y.csv', float_format='%.6g')
+
+    report = {
+        'mode': mode,
+        **({'models': list(models or DEFAULT_ENSEMBLE)} if mode == 'ensemble' else {}),
+        'start_date': equity.index[0].strftime('%Y-%m-%d'),
+        'end_date': equity.index[-1].strftime('%Y-%m-%d'),
+        'days': len(equity),
+        'capital': capital,
+        'final_equity': float(equity['TOTAL PORTFOLIO'].iloc[-1]),
+        'portfolio': _stat_dict(table.loc['TOTAL PORTFOLIO']),
+        'sectors': {s: {'final_equity': float(equity[s].iloc[-1]), **_stat_dict(table.loc[s])}
+                    for s in equity.columns if s != 'TOTAL PORTFOLIO'},
+    }
+
+    if cache is not None:
+        report['cache'] = cache.stats().reset_index().to_dict(orient='records')
+
+    if plot:
+        render_png(equity, report['portfolio'], out_dir / 'performance.png', dpi)
+
+    finished = time.perf_counter()
+    report['timings'] = {'import_seconds': round(start - _STARTED, 4),
+                         'compute_seconds': round(computed - start, 4),
+                         'write_seconds': round(finished - computed, 4),
+                         'startup_to_results_seconds': round(finished - _STARTED, 4)}
+    with open(out_dir / 'metrics.json', 'w') as fh:
+        json.dump(report, fh, indent=1)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Headless portfolio backtest report")
+    parser.add_argument('--out', type=Path, default=Path(__file__).resolve().parent.parent / 'reports')
+    parser.add_argument('--mode', choices=['panel', 'serial', 'parallel', 'compact', 'ensemble', 'voltarget'], default='panel')
+    parser.add_argument('--workers', type=int, default=None, help="pool size for --mode parallel")
+    parser.add_argument('--models', nargs='+', default=None, metavar='SPEC',
+                        help="signal models for --mode ensemble, e.g. sma:20:120 ema:16:64 breakout:55 momentum:250")
+    parser.add_argument('--plot', action='store_true', help="also render performance.png (Agg, downsampled)")
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--cache', action='store_true', help="reuse per-symbol results from data/cache (serial mode)")
+    parser.add_argument('--profile', action='store_true',
+                        help="record stage timings/memory to profile.json and profile.trace.json in --out")
+    args = parser.parse_args()
+
+    if args.profile:
+        import profiling
+        profiling.enable(track_memory=True)
+    result = write_report(args.out, args.mode, args.workers, plot=args.plot, dpi=args.dpi,
+                          cache=ResultCache() if args.cache else None, models=args.models)
+    if args.profile and result is not None:
+        profiling.disable().export(args.out)
+    if result is None:
+        print("No market data found; run generator.py first")
+    else:
+        p, t = result['portfolio'], result['timings']
+        print(f"Return {p['ann_return']:.2f}% | Sharpe {p['sharpe']:.2f} | Sortino {p['sortino']:.2f} | "
+              f"MaxDD {p['max_drawdown']:.2%} ({p['max_dd_days']:.0f}d) | Calmar {p['calmar']:.2f} | results in {t['startup_to_results_seconds']:.2f}s -> {args.out}")
@@ -0,0 +1,331 @@
+"""
+Portfolio Risk Targeting
+------------------------
+Portfolio-level volatility targeting on top of the per-asset sizing. The
+base engine sizes every market independently (risk_per_asset =
+target / sqrt(NUM_ASSETS), then sector caps), which ignores correlation:
+a book long every equity index carries far more risk than the same book
+spread across uncorrelated sectors.
+
+Here the covariance of one-contract daily dollar PnL across all markets
+is tracked incrementally, an exponentially weighted (RiskMetrics) or a
+rolling-window estimate, each updated in O(N^2) per day from the new
+return vector alone. Every day the intended book is scaled so its
+predicted daily dollar volatility equals capital x TARGET_DAILY_VOL,
+using only the covariance known at the previous close. Markets without a
+bar contribute zero PnL that day.
+
+Scales for many books (sweep configurations) share one covariance update
+per day and cost one quadratic form each.
+"""
+
+import json
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from engine import INITIAL_CAPITAL, TARGET_DAILY_VOL, NUM_ASSETS, RANGE_WINDOW
+from metrics import sharpe_ratio
+from panel import Panel, SweepResult, build_panel, panel_signals, panel_positions, prior_bar, unit_pnl
+from models import trend_signal_sweep
+from profiling import stage
+
+DEFAULT_HALFLIFE = 60
+DEFAULT_COV_WINDOW = 120
+DEFAULT_MAX_SCALE = 3.0
+
+
+# --- INCREMENTAL COVARIANCE ---
+
+class _Covariance(ABC):
+    """Shared interface: update(returns), matrix, portfolio_variance(positions), persistence."""
+
+    _ARRAYS: Sequence[str] = ()
+
+    def __init__(self, num_assets: int):
+        self.num_assets = num_assets
+        self.count = 0
+
+    @abstractmethod
+    def update(self, returns: np.ndarray) -> None:
+        """Folds in one day of per-asset returns."""
+
+    @property
+    @abstractmethod
+    def matrix(self) -> np.ndarray:
+        """Current (assets x assets) covariance estimate."""
+
+    def portfolio_variance(self, positions: np.ndarray) -> np.ndarray:
+        """p' C p for positions of shape (..., assets), floored at zero."""
+        return np.maximum(((positions @ self.matrix) * positions).sum(axis=-1), 0.0)
+
+    def save(self, path: Path) -> None:
+        """Persists the estimator as <path>/covariance.npz plus covariance.json."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.savez(path / 'covariance.npz', **{name: getattr(self, name) for name in self._ARRAYS})
+        with open(path / 'covariance.json', 'w') as fh:
+            json.dump({'kind': type(self).__name__, 'count': self.count, **self._params()}, fh, indent=1)
+
+    def _params(self) -> dict:
+        return {'num_assets': self.num_assets}
+
+    @staticmethod
+    def load(path: Path) -> '_Covariance':
+        path = Path(path)
+        with open(path / 'covariance.json') as fh:
+            meta = json.load(fh)
+        cls = {'EWMACovariance': EWMACovariance, 'RollingCovariance': RollingCovariance}[meta.pop('kind')]
+        count = meta.pop('count')
+        est = cls(**meta)
+        arrays = np.load(path / 'covariance.npz')
+        for name in cls._ARRAYS:
+            setattr(est, name, arrays[name].copy())
+        est.count = count
+        return est
+
+
+class EWMACovariance(_Covariance):
+    """
+    Zero-mean exponentially weighted covariance, C <- lam C + (1 - lam) r r'.
+    The decay is kept as a running scalar, so each day adds one outer
+    product instead of also rescaling the whole matrix.
+    """
+
+    _ARRAYS = ('weighted',)
+
+    def __init__(self, num_assets: int, halflife: float = DEFAULT_HALFLIFE):
+        super().__init__(num_assets)
+        self.halflife = halflife
+        self.decay = 0.5 ** (1.0 / halflife)
+        self.weighted = np.zeros((num_assets, num_assets))
+        self._scale = 1.0
+        self._buffer = np.empty((num_assets, num_assets))
+
+    def _params(self) -> dict:
+        return {'num_assets': self.num_assets, 'halflife': self.halflife}
+
+    def _normalize(self) -> None:
+        self.weighted *= self._scale
+        self._scale = 1.0
+
+    def update(self, returns: np.ndarray) -> None:
+        r = np.nan_to_num(np.asarray(returns, dtype=np.float64))
+        self._scale *= self.decay
+        np.outer(r * ((1 - self.decay) / self._scale), r, out=self._buffer)
+        self.weighted += self._buffer
+        if self._scale < 1e-150:
+            self._normalize()
+        self.count += 1
+
+    def _bias(self) -> float:
+        # Bias correction so early estimates are not shrunk towards zero
+        return self._scale / (1 - self.decay ** self.count) if self.count else self._scale
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.weighted * self._bias()
+
+    def portfolio_variance(self, positions: np.ndarray) -> np.ndarray:
+        quad = ((positions @ self.weighted) * positions).sum(axis=-1)
+        return np.maximum(quad * self._bias(), 0.0)
+
+    def save(self, path: Path) -> None:
+        self._normalize()
+        super().save(path)
+
+
+class RollingCovariance(_Covariance):
+    """
+    Sample covariance of the last `window` days, kept as running sums of
+    r and r r'; the day leaving the window is subtracted, not recomputed.
+    """
+
+    _ARRAYS = ('ring', 'total', 'outer_total')
+
+    def __init__(self, num_assets: int, window: int = DEFAULT_COV_WINDOW):
+        super().__init__(num_assets)
+        if window < 2:
+            raise ValueError(f"Covariance window must be at least 2, got {window}")
+        self.window = window
+        self.ring = np.zeros((window, num_assets))
+        self.total = np.zeros(num_assets)
+        self.outer_total = np.zeros((num_assets, num_assets))
+        self._buffer = np.empty((num_assets, num_assets))
+
+    def _params(self) -> dict:
+        return {'num_assets': self.num_assets, 'window': self.window}
+
+    def update(self, returns: np.ndarray) -> None:
+        r = np.nan_to_num(np.asarray(returns, dtype=np.float64))
+        slot = self.count % self.window
+        if self.count >= self.window:
+            # Rank-2 update r r' - old old' as one matrix product
+            old = self.ring[slot]
+            np.dot(np.stack([r, old]).T, np.stack([r, -old]), out=self._buffer)
+            self.total -= old
+        else:
+            np.outer(r, r, out=self._buffer)
+        self.outer_total += self._buffer
+        self.ring[slot] = r
+        self.total += r
+        self.count += 1
+
+    @property
+    def matrix(self) -> np.ndarray:
+        n = min(self.count, self.window)
+        if n < 2:
+            return np.zeros((self.num_assets, self.num_assets))
+        return (self.outer_total - np.outer(self.total, self.total) / n) / (n - 1)
+
+    def portfolio_variance(self, positions: np.ndarray) -> np.ndarray:
+        n = min(self.count, self.window)
+        if n < 2:
+            return np.zeros(positions.shape[:-1])
+        quad = ((positions @ self.outer_total) * positions).sum(axis=-1) - (positions @ self.total) ** 2 / n
+        return np.maximum(quad / (n - 1), 0.0)
+
+
+def make_estimator(kind: str, num_assets: int, halflife: float = DEFAULT_HALFLIFE,
+                   window: int = DEFAULT_COV_WINDOW) -> _Covariance:
+    if kind == 'ewma':
+        return EWMACovariance(num_assets, halflife)
+    if kind == 'rolling':
+        return RollingCovariance(num_assets, window)
+    raise ValueError(f"Unknown covariance estimator: {kind}")
+
+
+# --- VOLATILITY TARGETING ---
+
+def vol_target_scales(unit_moves: np.ndarray, held_signal: np.ndarray, pos_size: np.ndarray,
+                      estimator: _Covariance, target_dollars: float,
+                      max_scale: float = DEFAULT_MAX_SCALE, min_periods: int = 60) -> np.ndarray:
+    """
+    Daily scale factors that bring each book to the target dollar volatility.
+
+    Args:
+        unit_moves: (dates x assets) daily dollar PnL of one long contract.
+        held_signal: (dates x assets) or (books x dates x assets) signal each
+            market holds into the day, i.e. its signal on its previous bar
+            (prior_bar(signal, valid)).
+        pos_size: (dates x assets) base contract counts.
+        estimator: Covariance state, updated in place with every row.
+
+    Returns:
+        (dates,) or (books x dates) scales; the book earning the move into
+        day t is held_signal[t] x pos_size[t] (the engine's PnL alignment)
+        and is scaled with the covariance through day t-1. Until
+        `min_periods` days have been seen the scale is 1.
+    """
+    num_days = unit_moves.shape[0]
+    scales = np.ones(held_signal.shape[:-1])
+    for t in range(num_days):
+        if t and estimator.count >= min_periods:
+            book = held_signal[..., t, :] * pos_size[t]
+            vol = np.sqrt(estimator.portfolio_variance(book))
+            with np.errstate(divide='ignore'):
+                scales[..., t] = np.where(vol > 0, np.minimum(target_dollars / vol, max_scale), 1.0)
+        estimator.update(unit_moves[t])
+    return scales
+
+
+def scaled_positions(held_signal: np.ndarray, pos_size: np.ndarray, scales: np.ndarray,
+                     caps: np.ndarray) -> np.ndarray:
+    """
+    Signed contracts earning each day's move: the book held_signal x pos_size
+    (see vol_target_scales), scaled, rounded and clipped to `caps`.
+    """
+    book = held_signal * pos_size
+    sized = np.round(np.abs(book) * scales[..., None])
+    return np.sign(book) * np.minimum(sized, caps)
+
+
+def run_vol_target_backtest(panel: Panel, estimator: str = 'ewma', halflife: float = DEFAULT_HALFLIFE,
+                            window: int = DEFAULT_COV_WINDOW, target_vol: float = TARGET_DAILY_VOL,
+                            max_scale: float = DEFAULT_MAX_SCALE, short_window: int = 20,
+                            long_window: int = 120, capital: float = INITIAL_CAPITAL,
+                            num_assets: int = NUM_ASSETS, range_window: int = RANGE_WINDOW) -> pd.DataFrame:
+    """
+    Sector daily PnL of the trend portfolio scaled to a portfolio volatility
+    target of capital x target_vol with an incremental covariance estimate.
+    """
+    risk_per_asset = capital * TARGET_DAILY_VOL / np.sqrt(num_assets)
+    ticks, valid = panel.ticks, panel.valid
+
+    with stage('signals'):
+        signal = panel_signals(ticks, valid, short_window, long_window)
+    with stage('sizing'):
+        pos_size = panel_positions(ticks, valid, panel.scale, panel.multiplier, panel.caps,
+                                   risk_per_asset, range_window)
+        unit_moves = unit_pnl(panel.close, np.ones_like(panel.close), panel.multiplier)
+        held = prior_bar(signal, valid)[0]
+    with stage('covariance', estimator=estimator):
+        est = make_estimator(estimator, len(panel.symbols), halflife, window)
+        scales = vol_target_scales(unit_moves, held, pos_size, est, capital * target_vol, max_scale)
+    with stage('pnl'):
+        # Sector caps bound the base book; scaling may lift it to at most max_scale x the cap
+        pnl = unit_moves * scaled_positions(held, pos_size, scales, panel.caps * max_scale)
+
+    with stage('aggregate'):
+        return pd.DataFrame(pnl @ panel.sector_matrix(), index=panel.dates, columns=panel.sector_names)
+
+
+def run_vol_target_sweep(panel: Panel, short_windows: Sequence[int], long_windows: Sequence[int],
+                         estimator: str = 'ewma', halflife: float = DEFAULT_HALFLIFE,
+                         window: int = DEFAULT_COV_WINDOW, target_vol: float = TARGET_DAILY_VOL,
+                         max_scale: float = DEFAULT_MAX_SCALE, capital: float = INITIAL_CAPITAL,
+                         num_assets: int = NUM_ASSETS, range_window: int = RANGE_WINDOW,
+                         batch_size: int = 32) -> SweepResult:
+    """
+    run_panel_sweep with every window pair vol-targeted; all pairs share a
+    single covariance pass and differ only in their daily quadratic form.
+    """
+    risk_per_asset = capital * TARGET_DAILY_VOL / np.sqrt(num_assets)
+    ticks, valid = panel.ticks, panel.valid
+
+    signals, pairs = trend_signal_sweep(ticks, short_windows, long_windows, valid)
+    pos_size = panel_positions(ticks, valid, panel.scale, panel.multiplier, panel.caps,
+                               risk_per_asset, range_window)
+    unit_moves = unit_pnl(panel.close, np.ones_like(panel.close), panel.multiplier)
+    held_signals = prior_bar(signals, valid)[0]
+    est = make_estimator(estimator, len(panel.symbols), halflife, window)
+    scales = vol_target_scales(unit_moves, held_signals, pos_size, est, capital * target_vol, max_scale)
+
+    pnl = np.zeros((len(pairs), len(panel.dates)))
+    for start in range(0, len(pairs), batch_size):
+        block = slice(start, start + batch_size)
+        held = scaled_positions(held_signals[block], pos_size, scales[block], panel.caps * max_scale)
+        pnl[block] = np.einsum('pds,ds->pd', held, unit_moves)
+
+    return SweepResult(dates=panel.dates, pairs=pairs, signals=signals, pnl=pnl,
+                       sharpe=sharpe_ratio(pnl, capital))
+
+
+if __name__ == "__main__":
+    import argparse
+    from metrics import summarize
+    from panel import run_panel_backtest
+
+    parser = argparse.ArgumentParser(description="Portfolio volatility targeting with an incremental covariance")
+    parser.add_argument('--estimator', choices=['ewma', 'rolling'], default='ewma')
+    parser.add_argument('--halflife', type=float, default=DEFAULT_HALFLIFE, help="EWMA half-life in days")
+    parser.add_argument('--window', type=int, default=DEFAULT_COV_WINDOW, help="rolling window in days")
+    parser.add_argument('--target', type=float, default=TARGET_DAILY_VOL, help="daily volatility target")
+    args = parser.parse_args()
+
+    panel = build_panel()
+    if panel is None:
+        print("No market data found; run generator.py first")
+    else:
+        base = run_panel_backtest(panel).sum(axis=1).to_numpy()
+        targeted = run_vol_target_backtest(panel, args.estimator, args.halflife, args.window,
+                                           args.target).sum(axis=1).to_numpy()
+        table = summarize(np.vstack([base, targeted]), INITIAL_CAPITAL)
+        table.index = ['independent sizing', f'{args.estimator} vol target']
+        table['realized_daily_vol'] = np.std([base, targeted], axis=1) / INITIAL_CAPITAL
+        pd.set_option('display.width', 160)
+        pd.set_option('display.max_columns', 20)
+        print(table.round(4))
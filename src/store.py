@@ -0,0 +1,260 @@
+"""
+Columnar Market Data Store
+--------------------------
+Memory-mapped NumPy storage for multi-asset OHLC history. All symbols
+share a single business-day index and every field is held as one
+contiguous (dates x symbols) array, so loading the full universe is a
+handful of zero-copy memory maps instead of one CSV parse per market.
+
+Layout of a store directory:
+    meta.json      Symbol order, per-symbol tick size and decimals, stored
+                   fields and the number of simulated paths
+    dates.npy      datetime64[ns] shared date index
+    Open.npy ...   float64 (dates x symbols) price arrays, NaN = no bar;
+                   (paths x dates x symbols) for Monte-Carlo path stores
+"""
+
+import json
+import mmap
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ('Open', 'High', 'Low', 'Close')
+STORE_VERSION = 1
+
+
+def default_data_folder() -> Path:
+    """Returns the repository-level data/ folder used by all scripts."""
+    return Path(__file__).resolve().parent.parent / 'data'
+
+
+def release_pages(arr: np.ndarray) -> None:
+    """
+    Flushes a memory-mapped array and drops its resident pages from this
+    process (the data stays in the file and the OS page cache), keeping
+    RSS flat while a long array is streamed block by block.
+    """
+    mm = getattr(arr, '_mmap', None)
+    if mm is None:
+        return
+    if arr.flags.writeable:
+        arr.flush()
+    if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_DONTNEED'):
+        mm.madvise(mmap.MADV_DONTNEED)
+
+
+def default_store_path() -> Path:
+    """Returns the default location of the binary market store."""
+    return default_data_folder() / 'market'
+
+
+class MarketStore:
+    """
+    Read-only view over a store directory.
+
+    Field arrays are opened with mmap_mode='r', so slicing a symbol column
+    or a date range never copies price data until it is actually used.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path / 'meta.json') as fh:
+            meta = json.load(fh)
+
+        self.symbols: List[str] = list(meta['symbols'])
+        self.ticks: Dict[str, float] = dict(zip(self.symbols, meta['ticks']))
+        self.decimals: Dict[str, int] = dict(zip(self.symbols, meta['decimals']))
+        self.fields: List[str] = list(meta.get('fields', FIELDS))
+        self.num_paths: int = int(meta.get('paths', 1))
+        self._index = {sym: i for i, sym in enumerate(self.symbols)}
+        self._raw_dates = np.load(self.path / 'dates.npy', mmap_mode='r')
+        self._fields = {f: np.load(self.path / f'{f}.npy', mmap_mode='r') for f in self.fields}
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.symbols)
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self._raw_dates, name='Date')
+
+    def field(self, name: str = 'Close', path: Optional[int] = None) -> np.ndarray:
+        """
+        Returns the memory-mapped (dates x symbols) array for one field. For
+        path stores, `path` selects one path; None returns the full
+        (paths x dates x symbols) array.
+        """
+        arr = self._fields[name]
+        if arr.ndim == 3 and path is not None:
+            return arr[path]
+        return arr
+
+    def release(self) -> None:
+        """Drops resident pages of every field map (see release_pages)."""
+        for arr in self._fields.values():
+            release_pages(arr)
+
+    def column(self, symbol: str, field: str = 'Close', path: int = 0) -> np.ndarray:
+        """Returns a zero-copy (strided) view of one symbol's field."""
+        return self.field(field, path)[:, self._index[symbol]]
+
+    def frame(self, symbol: str, path: int = 0) -> pd.DataFrame:
+        """
+        Materializes one symbol in the same shape as the legacy CSV files
+        (Date, Open, High, Low, Close), dropping dates with no bar.
+        """
+        i = self._index[symbol]
+        close = self.field('Close', path)[:, i]
+        valid = ~np.isnan(close)
+        data = {'Date': self._raw_dates[valid]}
+        for f in self.fields:
+            data[f] = np.asarray(self.field(f, path)[valid, i])
+        return pd.DataFrame(data)
+
+
+class StoreWriter:
+    """
+    Chunked writer for a new store. Field files are pre-allocated as
+    memory-mapped .npy arrays and filled block by block, so stores far
+    larger than RAM can be produced; close() publishes the directory
+    atomically. Disjoint blocks may be written from several threads.
+    """
+
+    def __init__(self, path: Path, dates: Sequence, symbols: Sequence[str], ticks: Sequence[float],
+                 decimals: Sequence[int], fields: Sequence[str] = FIELDS, paths: int = 1):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + '.tmp')
+        if self.tmp.exists():
+            shutil.rmtree(self.tmp)
+        os.makedirs(self.tmp)
+
+        dates = np.asarray(pd.DatetimeIndex(dates).values, dtype='datetime64[ns]')
+        np.save(self.tmp / 'dates.npy', dates)
+        shape = (len(dates), len(symbols)) if paths == 1 else (paths, len(dates), len(symbols))
+        self.arrays = {f: np.lib.format.open_memmap(self.tmp / f'{f}.npy', mode='w+',
+                                                    dtype=np.float64, shape=shape) for f in fields}
+        self.meta = {'version': STORE_VERSION, 'symbols': list(symbols),
+                     'ticks': [float(t) for t in ticks], 'decimals': [int(d) for d in decimals],
+                     'fields': list(fields), 'paths': int(paths)}
+
+    def write(self, field: str, block: np.ndarray, symbols: slice = slice(None),
+              paths: slice = slice(None), rows: slice = slice(None)) -> None:
+        """Writes a (dates x symbols) or (paths x dates x symbols) block."""
+        arr = self.arrays[field]
+        if arr.ndim == 2:
+            arr[rows, symbols] = block
+        else:
+            arr[paths, rows, symbols] = block
+
+    def release(self) -> None:
+        """Writes filled blocks back to disk and drops their resident pages."""
+        for arr in self.arrays.values():
+            release_pages(arr)
+
+    def close(self) -> MarketStore:
+        for arr in self.arrays.values():
+            arr.flush()
+        self.arrays.clear()
+        with open(self.tmp / 'meta.json', 'w') as fh:
+            json.dump(self.meta, fh, indent=1)
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        os.replace(self.tmp, self.path)
+        return MarketStore(self.path)
+
+
+def write_store(path: Path, dates: Sequence, symbols: Sequence[str],
+                fields: Dict[str, np.ndarray], ticks: Sequence[float],
+                decimals: Sequence[int]) -> MarketStore:
+    """
+    Writes a complete store. Each entry of `fields` must be a
+    (len(dates) x len(symbols)) array. The directory is replaced atomically
+    so readers never observe a half-written store.
+    """
+    writer = StoreWriter(path, dates, symbols, ticks, decimals)
+    for f in FIELDS:
+        arr = np.asarray(fields[f], dtype=np.float64)
+        if arr.shape != (len(dates), len(symbols)):
+            raise ValueError(f"Field '{f}' has shape {arr.shape}, expected {(len(dates), len(symbols))}")
+        writer.write(f, arr)
+    return writer.close()
+
+
+def open_store(path: Optional[Path] = None) -> Optional[MarketStore]:
+    """Opens the store at `path` (default data/market), or None if absent."""
+    path = Path(path) if path is not None else default_store_path()
+    if not (path / 'meta.json').exists():
+        return None
+    return MarketStore(path)
+
+
+def load_store(data_folder: Optional[Path] = None) -> Optional[MarketStore]:
+    """
+    Opens data/market, importing legacy CSV files into a new store first
+    when only CSVs are present. Returns None when there is no data at all.
+    """
+    data_folder = Path(data_folder) if data_folder is not None else default_data_folder()
+    if not data_folder.exists():
+        return None
+    store = open_store(data_folder / 'market')
+    if store is None and any(f.suffix == '.csv' for f in data_folder.iterdir()):
+        store = import_csv_folder(data_folder, data_folder / 'market')
+    return store
+
+
+# --- CSV SECONDARY PATH ---
+
+def _count_decimals(text: pd.Series) -> int:
+    frac = text.str.partition('.')[2]
+    return int(frac.str.len().max()) if len(frac) else 0
+
+
+def import_csv_folder(csv_folder: Path, path: Optional[Path] = None,
+                      excluded: Sequence[str] = ()) -> MarketStore:
+    """
+    Builds a store from a folder of per-symbol CSV files. Symbols are
+    outer-joined on date; decimals are inferred from the CSV text and the
+    tick is taken as one unit in the last printed decimal.
+    """
+    csv_folder = Path(csv_folder)
+    path = Path(path) if path is not None else default_store_path()
+    files = sorted(f for f in os.listdir(csv_folder) if f.endswith('.csv') and f[:-4] not in excluded)
+
+    frames, symbols, decimals = [], [], []
+    for file in files:
+        raw = pd.read_csv(csv_folder / file, dtype={f: str for f in FIELDS}, parse_dates=['Date'])
+        decimals.append(max(_count_decimals(raw[f]) for f in FIELDS))
+        symbols.append(file[:-4])
+        frames.append(raw.set_index('Date')[list(FIELDS)].astype(np.float64))
+
+    if not frames:
+        raise FileNotFoundError(f"No CSV files found in {csv_folder}")
+
+    dates = frames[0].index
+    for df in frames[1:]:
+        dates = dates.union(df.index)
+
+    fields = {f: np.column_stack([df[f].reindex(dates).to_numpy() for df in frames]) for f in FIELDS}
+    ticks = [10.0 ** -d for d in decimals]
+    return write_store(path, dates, symbols, fields, ticks, decimals)
+
+
+def export_csv_folder(store: MarketStore, csv_folder: Path,
+                      symbols: Optional[Sequence[str]] = None) -> None:
+    """Writes one legacy-format CSV per symbol using its stored precision."""
+    csv_folder = Path(csv_folder)
+    os.makedirs(csv_folder, exist_ok=True)
+    for symbol in symbols or store.symbols:
+        df = store.frame(symbol)
+        df.to_csv(csv_folder / f"{symbol}.csv", index=False,
+                  float_format=f"%.{store.decimals[symbol]}f", date_format='%Y-%m-%d')
@@ -0,0 +1,149 @@
+"""
+Monte Carlo Stress Testing
+--------------------------
+Runs the full trend model, volatility sizing and sector caps over many
+alternative histories and reports the distribution of annualized return,
+Sharpe, Sortino and maximum drawdown.
+
+Histories come in (paths x dates x symbols) batches and each batch is a
+single panel computation (panel.run_panel_batch). Sources:
+    simulate   fresh synthetic paths from the seeded generator (in memory)
+    store      a Monte-Carlo path store written by 'generator.py --paths N'
+    bootstrap  moving-block resamples of the historical daily moves
+"""
+
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from engine import INITIAL_CAPITAL, get_sector
+from generator import ANCHORS, history_dates, iter_path_batches, universe_decimals
+from metrics import summarize
+from panel import Panel, build_panel, make_panel, run_panel_batch
+from store import MarketStore, open_store, default_data_folder
+
+
+@dataclass
+class StressResult:
+    """Per-path metrics plus wall-clock throughput of a stress run."""
+    metrics: pd.DataFrame
+    elapsed: float
+    source: str
+
+    @property
+    def paths_per_second(self) -> float:
+        return len(self.metrics) / self.elapsed if self.elapsed > 0 else float('inf')
+
+    def summary(self, percentiles: Sequence[float] = (5, 25, 50, 75, 95)) -> pd.DataFrame:
+        """Mean, dispersion and percentiles of each metric across paths."""
+        table = self.metrics.describe(percentiles=[p / 100 for p in percentiles]).T
+        return table.drop(columns='count')
+
+
+def _store_batches(store: MarketStore, template: Panel, num_paths: int, batch_size: int) -> Iterator[np.ndarray]:
+    position = {s: i for i, s in enumerate(store.symbols)}
+    cols = [position[s] for s in template.symbols]
+    close = store.field('Close')
+    if close.ndim == 2:
+        close = close[None]
+    for p0 in range(0, min(num_paths, close.shape[0]), batch_size):
+        yield np.asarray(close[p0:min(p0 + batch_size, num_paths), :, cols])
+
+
+def _bootstrap_batches(template: Panel, num_paths: int, batch_size: int, block_length: int,
+                       seed: Optional[int]) -> Iterator[np.ndarray]:
+    """
+    Resamples blocks of whole-universe daily moves (preserving cross-market
+    correlation) and re-integrates them from the first observed prices.
+    Moves are taken in integer ticks, so resampled prices stay on the grid.
+    """
+    complete = template.valid.all(axis=1)
+    ticks = template.ticks[complete]
+    moves = np.diff(ticks, axis=0)
+    num_moves = moves.shape[0]
+    # Checked here, not on first iteration, so bad arguments fail before any batch is requested
+    if not 1 <= block_length <= num_moves:
+        raise ValueError(f"Bootstrap block_length must be between 1 and the number of daily moves on dates "
+                         f"where every market has a bar: block_length={block_length}, num_moves={num_moves}")
+    return _resample_blocks(ticks, moves, template.scale, num_paths, batch_size, block_length, seed)
+
+
+def _resample_blocks(ticks: np.ndarray, moves: np.ndarray, scale: np.ndarray, num_paths: int,
+                     batch_size: int, block_length: int, seed: Optional[int]) -> Iterator[np.ndarray]:
+    num_moves = moves.shape[0]
+    rng = np.random.default_rng(seed)
+    offsets = np.arange(block_length)
+
+    for p0 in range(0, num_paths, batch_size):
+        n = min(batch_size, num_paths - p0)
+        num_blocks = -(-num_moves // block_length)
+        starts = rng.integers(0, num_moves - block_length + 1, size=(n, num_blocks))
+        idx = (starts[:, :, None] + offsets).reshape(n, -1)[:, :num_moves]
+        path_ticks = np.empty((n, num_moves + 1, ticks.shape[1]), dtype=np.int64)
+        path_ticks[:, 0] = ticks[0]
+        np.cumsum(moves[idx], axis=1, out=path_ticks[:, 1:])
+        path_ticks[:, 1:] += ticks[0]
+        yield path_ticks / scale
+
+
+def run_stress_test(source: str = 'simulate', num_paths: int = 1000, batch_size: int = 16,
+                    seed: Optional[int] = None, block_length: int = 20,
+                    store_path: Optional[Path] = None, capital: float = INITIAL_CAPITAL) -> StressResult:
+    """
+    Evaluates the portfolio on `num_paths` alternative histories.
+
+    Args:
+        source: 'simulate', 'store' or 'bootstrap' (see module docstring).
+        batch_size: Paths per vectorized batch; memory grows linearly with it.
+        block_length: Block size in days for the bootstrap.
+    """
+    data_folder = default_data_folder()
+
+    if source == 'simulate':
+        anchors = {s: a for s, a in ANCHORS.items() if get_sector(s)}
+        dates = history_dates()
+        template = make_panel(dates, list(anchors), np.empty((len(dates), len(anchors))),
+                              universe_decimals(anchors))
+        batches = iter_path_batches(anchors, num_paths, seed, dates, batch_size)
+    elif source == 'store':
+        store_path = Path(store_path) if store_path is not None else data_folder / 'paths'
+        store = open_store(store_path)
+        if store is None:
+            raise FileNotFoundError(f"No path store at {store_path}; run 'generator.py --paths N' first")
+        template = build_panel(store)
+        batches = _store_batches(store, template, num_paths, batch_size)
+    elif source == 'bootstrap':
+        template = build_panel(data_folder=data_folder)
+        if template is None:
+            raise FileNotFoundError("No market history to resample; run generator.py first")
+        batches = _bootstrap_batches(template, num_paths, batch_size, block_length, seed)
+    else:
+        raise ValueError(f"Unknown stress source: {source}")
+
+    start = time.perf_counter()
+    results = [summarize(run_panel_batch(template, batch, capital=capital), capital) for batch in batches]
+    elapsed = time.perf_counter() - start
+
+    metrics = pd.concat(results, ignore_index=True) if results else summarize(np.zeros((0, 1)), capital)
+    metrics.index.name = 'path'
+    return StressResult(metrics=metrics, elapsed=elapsed, source=source)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Monte Carlo stress test of the trend portfolio")
+    parser.add_argument('--source', choices=['simulate', 'store', 'bootstrap'], default='simulate')
+    parser.add_argument('--paths', type=int, default=1000)
+    parser.add_argument('--batch', type=int, default=16)
+    parser.add_argument('--block', type=int, default=20, help="bootstrap block length in days")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    result = run_stress_test(args.source, args.paths, args.batch, args.seed, args.block)
+    pd.set_option('display.width', 160)
+    print(result.summary().round(3))
+    print(f"\n{len(result.metrics)} paths in {result.elapsed:.2f}s | {result.paths_per_second:.1f} paths/sec")
@@ -1,33 +1,43 @@
+import numpy as np
 import pandas as pd
-import matplotlib
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import os
 from pathlib import Path
+from typing import Optional
 
-# Ensure interactive backend for windowed display
-try:
-    matplotlib.use('TkAgg')
-except:
-    pass
+from loader import SymbolLoader
 
 
-def plot_hover_visualizer():
+def plot_hover_visualizer(save_path: Optional[Path] = None):
     """
     Interactive diagnostic tool to visualize normalized asset performance.
-    Uses actual CSV date columns for 100% temporal accuracy.
+    Uses actual stored date columns for 100% temporal accuracy.
+
+    With save_path the chart is rendered off-screen (Agg) to that file
+    instead of opening a window.
     """
+    import matplotlib
+    if save_path:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    # Ensure interactive backend for windowed display
+    if not save_path:
+        try:
+            matplotlib.use('TkAgg')
+        except:
+            pass
+    import matplotlib.dates as mdates
+    from plotting import CurveHover
+
     plt.style.use('default')
     script_dir = Path(__file__).resolve().parent
     data_folder = script_dir.parent / 'data'
 
     # Filter excluded assets
-    excluded = ['BTC.csv', 'ETH.csv']
-    all_files = sorted([f for f in os.listdir(data_folder)
-                        if f.endswith('.csv') and f not in excluded])
+    excluded = ['BTC', 'ETH']
+    loader = SymbolLoader(data_folder, excluded=excluded)
 
-    if not all_files:
-        print("No CSV files found in /data/")
+    if not len(loader):
+        print("No market data found in /data/")
         return
 
     fig, ax = plt.subplots(figsize=(16, 9))
@@ -40,59 +50,31 @@ def plot_hover_visualizer():
     except:
         pass
 
-    colormap = plt.colormaps['gist_rainbow'].resampled(len(all_files))
-    lines = []
-
-    for i, file in enumerate(all_files):
-        symbol = file.replace('.csv', '')
-        # Read actual dates from the file
-        df = pd.read_csv(data_folder / file, parse_dates=['Date'])
+    colormap = plt.colormaps['gist_rainbow'].resampled(len(loader))
 
-        # Rebase price series to 100
-        norm_series = (df['Close'] / df['Close'].iloc[0]) * 100
+    # Rebase price series to 100 on one sorted date grid (NaN before a market's first bar);
+    # upcoming symbols are read while the current one is rebased
+    normalized = pd.concat({symbol: pd.Series((df['Close'] / df['Close'].iloc[0]).to_numpy() * 100,
+                                              index=pd.DatetimeIndex(df['Date']))
+                            for symbol, df in loader}, axis=1).sort_index()
+    values = normalized.to_numpy()
 
-        # Plot using the actual Date column from the CSV
-        line, = ax.plot(df['Date'], norm_series, label=symbol, color=colormap(i),
-                        linewidth=1.0, alpha=0.3)
-        lines.append(line)
+    # Lines start empty; CurveHover fills them with screen-resolution detail for the visible range
+    lines = [ax.plot([], [], label=symbol, color=colormap(i), linewidth=1.0, alpha=0.3)[0]
+             for i, symbol in enumerate(normalized.columns)]
 
     # Scale X-axis to match data limits
-    ax.set_xlim(left=df['Date'].min(), right=df['Date'].max())
+    ax.set_xlim(left=normalized.index.min(), right=normalized.index.max())
+    ax.set_ylim(np.nanmin(values) * 0.95, np.nanmax(values) * 1.05)
 
     # Temporal axis formatting
     ax.xaxis.set_major_locator(mdates.YearLocator())
     ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
     plt.xticks(rotation=0, ha='center', fontsize=9)
 
-    # Interactive Symbol Tooltip
-    annot = ax.annotate("", xy=(0, 0), xytext=(15, 15),
-                        textcoords="offset points",
-                        bbox=dict(boxstyle="round,pad=0.3", fc="#FFFFCC", ec="black", alpha=0.9),
-                        arrowprops=dict(arrowstyle="->"))
-    annot.set_visible(False)
-
-    def hover(event):
-        if event.inaxes == ax:
-            found = False
-            for line in lines:
-                cont, ind = line.contains(event)
-                if cont:
-                    annot.xy = (event.xdata, event.ydata)
-                    annot.set_text(f"Symbol: {line.get_label()}")
-                    annot.get_bbox_patch().set_edgecolor(line.get_color())
-                    annot.set_visible(True)
-                    line.set_linewidth(3.0)
-                    line.set_alpha(1.0)
-                    found = True
-                else:
-                    line.set_linewidth(1.0)
-                    line.set_alpha(0.3)
-
-            if not found:
-                annot.set_visible(False)
-            fig.canvas.draw_idle()
-
-    fig.canvas.mpl_connect("motion_notify_event", hover)
+    # Interactive Symbol Tooltip: nearest-date lookup, only highlight and tooltip are blitted
+    hover = CurveHover(ax, lines, normalized.index, values,
+                       lambda symbol, date, value: f"Symbol: {symbol}\n{date:%Y-%m-%d}  {value:,.1f}")
 
     ax.set_title("NORMALIZED ASSET COMPARISON", fontsize=18, fontweight='bold', pad=30)
     ax.axhline(100, color='black', linestyle='-', alpha=0.2, linewidth=1)
@@ -101,8 +83,18 @@ def plot_hover_visualizer():
     ax.grid(True, axis='x', linestyle=':', alpha=0.5)
 
     plt.tight_layout()
-    plt.show()
+    hover.refresh_detail()
+    if save_path:
+        fig.savefig(save_path)
+        plt.close(fig)
+    else:
+        plt.show()
+    hover.disconnect()
 
 
 if __name__ == "__main__":
-    plot_hover_visualizer()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Normalized asset comparison chart")
+    parser.add_argument('--save', type=Path, default=None, help="render headless to this image file")
+    args = parser.parse_args()
+    plot_hover_visualizer(args.save)
\ No newline at end of file